@@ -24,7 +24,7 @@ class Action:
     @property
     def engine(self) -> Engine:
         """Return the engine this action belongs to."""
-        return self.entity.gamemap.engine
+        return self.entity.engine
 
     def perform(self) -> None:
         """Perform this action with the objects needed to determine its scope.
@@ -37,6 +37,18 @@ class Action:
         """
         raise NotImplementedError()
 
+    def validate(self) -> Optional[str]:
+        """Return the reason this action can't be performed right now, or None if it can.
+
+        Subclasses that can fail should check here and have perform() raise
+        `exceptions.Impossible` with the reason, so that AI code can ask first
+        instead of raising and catching.
+        """
+        return None
+
+    def can_perform(self) -> bool:
+        return self.validate() is None
+
     def apply_cost(self, cost: int | float = 0) -> None:
         self.entity.fighter.stats.initiative.initiative.modify(
             amount=-int(cost), sudo=True
@@ -50,15 +62,12 @@ class PickupAction(Action):
         super().__init__(entity)
 
     def perform(self) -> None:
-        actor_location_x = self.entity.x
-        actor_location_y = self.entity.y
-        inventory = self.entity.inventory
-
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
-                self.engine.player.inventory.add(item)
-                self.apply_cost()
-                return
+        for item in self.engine.game_map.get_items_at_location(
+            self.entity.x, self.entity.y
+        ):
+            self.engine.player.inventory.add(item)
+            self.apply_cost()
+            return
 
         raise exceptions.Impossible("There is nothing here to pick up.")
 
@@ -113,7 +122,7 @@ class EquipEssenceAction(Action):
 
     def perform(self) -> None:
         self.entity.essence.equip(self.item)
-        self.entity.inventory.items.remove(self.item)
+        self.entity.inventory.remove(self.item)
 
 
 class WaitAction(Action):
@@ -242,27 +251,38 @@ class AttackAction(Action):
 
 
 class MeleeAction(ActionWithDirection):
+    def validate(self) -> Optional[str]:
+        if not self.target_actor:
+            return "Nothing to attack."
+        return None
+
     def perform(self) -> None:
-        target = self.target_actor
-        if not target:
-            raise exceptions.Impossible("Nothing to attack.")
+        reason = self.validate()
+        if reason:
+            raise exceptions.Impossible(reason)
 
-        AttackAction(attacker=self.entity, defender=target).perform()
+        AttackAction(attacker=self.entity, defender=self.target_actor).perform()
 
 
 class MovementAction(ActionWithDirection):
-    def perform(self) -> None:
+    def validate(self) -> Optional[str]:
         dest_x, dest_y = self.dest_xy
 
         if not self.engine.game_map.in_bounds(dest_x, dest_y):
             # Destination is out of bounds.
-            raise exceptions.Impossible("That way is blocked.")
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+            return "That way is blocked."
+        if not self.engine.game_map.is_walkable(dest_x, dest_y):
             # Destination is blocked by a tile.
-            raise exceptions.Impossible("That way is blocked.")
+            return "That way is blocked."
         if self.engine.game_map.get_blocking_entity_at_location(dest_x, dest_y):
             # Destination is blocked by an entity.
-            raise exceptions.Impossible("That way is blocked.")
+            return "That way is blocked."
+        return None
+
+    def perform(self) -> None:
+        reason = self.validate()
+        if reason:
+            raise exceptions.Impossible(reason)
 
         self.entity.move(self.dx, self.dy)
         if self.entity == self.engine.player:
@@ -272,6 +292,11 @@ class MovementAction(ActionWithDirection):
 
 class BumpAction(ActionWithDirection):
 
+    def validate(self) -> Optional[str]:
+        if self.target_actor:
+            return None
+        return MovementAction(self.entity, self.dx, self.dy).validate()
+
     def perform(self) -> None:
         if self.target_actor:
             return MeleeAction(self.entity, self.dx, self.dy).perform()
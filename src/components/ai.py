@@ -1,44 +1,117 @@
 from __future__ import annotations
 
 import random
-from typing import List, Optional, Tuple, TYPE_CHECKING
+from typing import List, Optional, Sequence, Tuple, TYPE_CHECKING
 
-import numpy as np  # type: ignore
-import tcod
+import numpy as np
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
+from components.intent_types import IntentTypes
 
 if TYPE_CHECKING:
+    from engine import Engine
     from entity import Actor
 
+# how far (in tiles) a new goal may be from the old one for a path to be repaired
+# instead of solved again from scratch
+PATH_REPAIR_RADIUS = 3
+
+
+class PathStats:
+    """Counts how many paths were solved from scratch and how many were repaired."""
+
+    def __init__(self) -> None:
+        self.full = 0
+        self.repaired = 0
+        # the same counts for the current turn, and for the one before it
+        self.turn_full = 0
+        self.turn_repaired = 0
+        self.last_turn_full = 0
+        self.last_turn_repaired = 0
+
+    def count(self, repaired: bool) -> None:
+        if repaired:
+            self.repaired += 1
+            self.turn_repaired += 1
+        else:
+            self.full += 1
+            self.turn_full += 1
+
+    def new_turn(self) -> None:
+        self.last_turn_full, self.last_turn_repaired = (
+            self.turn_full,
+            self.turn_repaired,
+        )
+        self.turn_full = self.turn_repaired = 0
+
+
+path_stats = PathStats()
+
+
+class TurnStats:
+    """Counts AI turns, and how many of them ended in an `exceptions.Impossible`."""
+
+    def __init__(self) -> None:
+        self.turns = 0
+        self.impossible = 0
+
+    @property
+    def impossible_per_thousand_turns(self) -> float:
+        if not self.turns:
+            return 0.0
+        return self.impossible * 1000 / self.turns
+
+
+turn_stats = TurnStats()
+
+
+def plan_intents(engine: Engine, actors: Sequence[Actor]) -> List[IntentTypes]:
+    """
+    Decide what each of `actors` intends to do against the player this turn.
+
+    Distance, visibility and adjacency are worked out for the whole batch at once,
+    which leaves only carrying the intents out to the individual AIs.
+    """
+    if not actors:
+        return []
+
+    target = engine.player
+    xy = np.array([(actor.x, actor.y) for actor in actors], dtype=np.int32)
+
+    # Chebyshev distance.
+    distance = np.abs(xy - np.array((target.x, target.y), dtype=np.int32)).max(axis=1)
+    sees_player = engine.game_map.visible[xy[:, 0], xy[:, 1]]
+
+    # 0 = idle, 1 = approach, 2 = attack
+    codes = sees_player.astype(np.int8) + (sees_player & (distance <= 1))
+    ranked = (IntentTypes.IDLE, IntentTypes.APPROACH, IntentTypes.ATTACK)
+    return [ranked[code] for code in codes.tolist()]
+
 
 class BaseAI(Action):
 
-    def perform(self) -> None:
+    def perform(self, intent: Optional[IntentTypes] = None) -> None:
+        """
+        Take this AI's turn. `intent` is the plan made for it by plan_intents,
+        AIs that don't get one work it out themselves.
+        """
         raise NotImplementedError()
 
-    def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
+    def get_path_to(
+        self, dest_x: int, dest_y: int, start: Optional[Tuple[int, int]] = None
+    ) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
+        The path starts from the entity's position, or from `start` if given.
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
-            # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
+        # The map keeps the cost array (walkable tiles, plus a penalty for tiles
+        # blocked by an entity) and the graph around, so only the search runs here.
+        pathfinder = self.entity.gamemap.pathfinder()
 
-        # Create a graph from the cost array and pass that graph to a new pathfinder.
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=2)
-        pathfinder = tcod.path.Pathfinder(graph)
-
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
+        if start is None:
+            start = self.entity.x, self.entity.y
+        pathfinder.add_root(start)  # Start position.
 
         # Compute the path to the destination and remove the starting point.
         path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
@@ -51,31 +124,100 @@ class HostileEnemy(BaseAI):
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
+        self.path_goal: Optional[Tuple[int, int]] = None
+        # where the player was last seen, chased with a path once they are out of sight
+        self.last_seen: Optional[Tuple[int, int]] = None
 
-    def perform(self) -> Action:
+    def perform(self, intent: Optional[IntentTypes] = None) -> Action:
         if not self.engine.player.is_alive:
             WaitAction(self.entity).perform()
         target = self.engine.player
         dx = target.x - self.entity.x
         dy = target.y - self.entity.y
-        distance = max(abs(dx), abs(dy))  # Chebyshev distance.
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
-            if distance <= 1:
-                return MeleeAction(self.entity, dx, dy).perform()
+        if intent is None:
+            [intent] = plan_intents(self.engine, [self.entity])
 
-            self.path = self.get_path_to(target.x, target.y)
+        if intent is IntentTypes.ATTACK:
+            return MeleeAction(self.entity, dx, dy).perform()
+        if intent is IntentTypes.APPROACH:
+            # While the player is in sight, walk down the shared flow field.
+            # The old path is kept around, it can often be repaired later.
+            self.last_seen = target.x, target.y
+            flow_field = self.engine.game_map.flow_field
+            flow_field.update(target.x, target.y)
+            step = flow_field.next_step(self.entity.x, self.entity.y)
+            if step:
+                dest_x, dest_y = step
+                return MovementAction(
+                    self.entity,
+                    dest_x - self.entity.x,
+                    dest_y - self.entity.y,
+                ).perform()
+        elif self.last_seen:
+            self.chase(*self.last_seen)
+            self.last_seen = None
 
         if self.path:
             dest_x, dest_y = self.path.pop(0)
 
-            return MovementAction(
+            movement = MovementAction(
                 self.entity,
                 dest_x - self.entity.x,
                 dest_y - self.entity.y,
-            ).perform()
+            )
+            if movement.can_perform():
+                return movement.perform()
         return WaitAction(self.entity).perform()
 
+    def chase(self, goal_x: int, goal_y: int) -> None:
+        """Point `self.path` at the goal, reusing the current path when it is still good."""
+        repaired = self.path_is_repairable(goal_x, goal_y)
+        if repaired:
+            self.repair_path(goal_x, goal_y)
+        else:
+            self.path = self.get_path_to(goal_x, goal_y)
+        self.path_goal = goal_x, goal_y
+        path_stats.count(repaired)
+
+    def path_is_repairable(self, goal_x: int, goal_y: int) -> bool:
+        """
+        Return True if the current path's next step can still be taken, and the new
+        goal is close enough to the old one to splice a new tail onto the path.
+        """
+        if self.path_goal is None:
+            return False
+        old_x, old_y = self.path_goal
+        if max(abs(goal_x - old_x), abs(goal_y - old_y)) > PATH_REPAIR_RADIUS:
+            return False
+
+        # drop the steps the entity already took (possibly while not following the path)
+        position = (self.entity.x, self.entity.y)
+        if position in self.path:
+            del self.path[: self.path.index(position) + 1]
+        if not self.path:
+            return False
+
+        next_x, next_y = self.path[0]
+        gamemap = self.entity.gamemap
+        return (
+            max(abs(next_x - self.entity.x), abs(next_y - self.entity.y)) == 1
+            and gamemap.is_walkable(next_x, next_y)
+            and not gamemap.get_blocking_entity_at_location(next_x, next_y)
+        )
+
+    def repair_path(self, goal_x: int, goal_y: int) -> None:
+        """Keep the path up to its step closest to the new goal, and solve only the rest."""
+        closest = min(
+            range(len(self.path)),
+            key=lambda i: max(
+                abs(self.path[i][0] - goal_x), abs(self.path[i][1] - goal_y)
+            ),
+        )
+        del self.path[closest + 1 :]
+        if self.path[-1] != (goal_x, goal_y):
+            self.path += self.get_path_to(goal_x, goal_y, start=self.path[-1])
+
 
 class ConfusedEnemy(BaseAI):
     """
@@ -91,7 +233,7 @@ class ConfusedEnemy(BaseAI):
         self.previous_ai = previous_ai
         self.turns_remaining = turns_remaining
 
-    def perform(self) -> None:
+    def perform(self, intent: Optional[IntentTypes] = None) -> None:
         # Revert the AI back to the original state if the effect has run its course.
         if self.turns_remaining <= 0:
             self.engine.message_log.add_message(
@@ -117,8 +259,11 @@ class ConfusedEnemy(BaseAI):
 
             # The actor will either try to move or attack in the chosen random direction.
             # Its possible the actor will just bump into the wall, wasting a turn.
-            return BumpAction(
+            bump = BumpAction(
                 self.entity,
                 direction_x,
                 direction_y,
-            ).perform()
+            )
+            if bump.can_perform():
+                return bump.perform()
+            return WaitAction(self.entity).perform()
@@ -17,4 +17,4 @@ class BaseComponent:
 
     @property
     def engine(self) -> Engine:
-        return self.gamemap.engine
+        return self.parent.engine
@@ -8,6 +8,7 @@ import components.ai
 import components.inventory
 from components.base_component import BaseComponent
 from exceptions import Impossible
+import spatial
 from input_handlers import (
     ActionOrHandler,
     AreaRangedAttackHandler,
@@ -37,7 +38,7 @@ class Consumable(BaseComponent):
         entity = self.parent
         inventory = entity.parent
         if isinstance(inventory, components.inventory.Inventory):
-            inventory.items.remove(entity)
+            inventory.remove(entity)
 
 
 class ConfusionConsumable(Consumable):
@@ -115,16 +116,16 @@ class FireballDamageConsumable(Consumable):
         if not self.engine.game_map.visible[target_xy]:
             raise Impossible("You cannot target an area that you cannot see.")
 
-        targets_hit = False
-        for actor in self.engine.game_map.actors:
-            if actor.distance(*target_xy) <= self.radius:
-                self.engine.message_log.add_message(
-                    f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
-                )
-                actor.fighter.take_damage(self.damage)
-                targets_hit = True
+        targets = spatial.actors_within_radius(
+            self.engine.game_map, *target_xy, self.radius
+        )
+        for actor in targets:
+            self.engine.message_log.add_message(
+                f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
+            )
+            actor.fighter.take_damage(self.damage)
 
-        if not targets_hit:
+        if not targets:
             raise Impossible("There are no targets in the radius.")
         self.consume()
 
@@ -136,16 +137,13 @@ class LightningDamageConsumable(Consumable):
 
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
-        target = None
-        closest_distance = self.maximum_range + 1.0
-
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:
-                    target = actor
-                    closest_distance = distance
+        target = spatial.nearest_visible_actor(
+            self.engine.game_map,
+            consumer.x,
+            consumer.y,
+            self.maximum_range,
+            exclude=consumer,
+        )
 
         if target:
             self.engine.message_log.add_message(
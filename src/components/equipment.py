@@ -58,6 +58,8 @@ class Equipment(BaseComponent):
         self.slots: dict[EquipmentTypes, Optional[Item]] = {
             slot: None for slot in EquipmentTypes
         }
+        # bumped whenever an item is equipped or unequipped
+        self.version = 0
 
     @property
     def is_two_handing(self) -> bool:
@@ -121,10 +123,10 @@ class Equipment(BaseComponent):
     def unequip_message(self, item_name: str, slots: Tuple[EquipmentTypes]) -> None:
         """Send a message to the player indicating an item was removed."""
         if len(slots) > 1:
-            self.parent.gamemap.engine.message_log.add_message(
+            self.engine.message_log.add_message(
                 f"You remove the {item_name} from the {[slot.value for slot in slots]} slots."
             )
-        self.parent.gamemap.engine.message_log.add_message(
+        self.engine.message_log.add_message(
             f"You remove the {item_name} from the {slots[0].value} slot."
         )
 
@@ -137,16 +139,16 @@ class Equipment(BaseComponent):
                     slots_message += f"{slot.value}"
                     continue
                 slots_message += f"{slot.value} and "
-            self.parent.gamemap.engine.message_log.add_message(
+            self.engine.message_log.add_message(
                 f"You equip the {item_name} to the {slots_message} slots."
             )
             return
-        self.parent.gamemap.engine.message_log.add_message(
+        self.engine.message_log.add_message(
             f"You equip the {item_name} to the {slots[0].value} slot."
         )
 
     def too_heavy_message(self, item_name: str) -> None:
-        self.parent.gamemap.engine.message_log.add_message(
+        self.engine.message_log.add_message(
             f"{item_name} is too heavy to equip!"
         )
 
@@ -235,6 +237,7 @@ class Equipment(BaseComponent):
         # Assign the item to all its slots
         for slot in slots_needed:
             self.slots[slot] = item
+        self.version += 1
 
         if add_message:
             self.equip_message(item.name, slots=slots_needed)
@@ -259,6 +262,7 @@ class Equipment(BaseComponent):
         # Remove the item from all slots it occupies
         for current in current_slots:
             self.slots[current] = None
+        self.version += 1
 
         if add_message:
             self.unequip_message(current_item.name, slots=current_slots)
@@ -19,6 +19,8 @@ class Essence(BaseComponent):
 
     def __init__(self):
         self.slots: List[Optional[Item]]
+        # bumped whenever the slots change
+        self.version = 0
 
     def init_hook(self) -> None:
         current_level = self.parent.level.current_level
@@ -26,6 +28,7 @@ class Essence(BaseComponent):
 
     def on_level_up(self) -> None:
         self.slots.append(None)
+        self.version += 1
 
     def equip(self, item: Item, add_message: bool = True) -> bool:
         # find if the player already has this type of essence equipped
@@ -39,6 +42,7 @@ class Essence(BaseComponent):
         for i, slot in enumerate(self.slots):
             if slot is None:
                 self.slots[i] = item
+                self.version += 1
                 item.equippable.equip(self.parent)
 
                 if add_message:
@@ -52,29 +56,30 @@ class Essence(BaseComponent):
             if slot == item:
                 item.equippable.unequip(self.parent)
                 self.slots[i] = None
+                self.version += 1
                 if add_message:
                     self.unequip_message(item.name)
 
     def equip_message(self, item_name: str) -> None:
         """Send a message to the player indicating an item was equipped."""
-        self.parent.gamemap.engine.message_log.add_message(
+        self.engine.message_log.add_message(
             f"You infuse yourself with the {item_name}."
         )
 
     def all_slots_full(self, item_name: str) -> None:
-        self.parent.gamemap.engine.message_log.add_message(
+        self.engine.message_log.add_message(
             f"You were unable to equip {item_name} as you do not have a free essence slot."
         )
 
     def unequip_message(self, item_name: str) -> None:
         """Send a message to the player indicating an item was removed."""
-        self.parent.gamemap.engine.message_log.add_message(
+        self.engine.message_log.add_message(
             f"The {item_name} is destroyed."
         )
 
     def already_type_equipped(self, item_name: str) -> None:
         """send a message to the player indicating that this type of essence
         is already equipped (essences are unique)"""
-        self.parent.gamemap.engine.message_log.add_message(
+        self.engine.message_log.add_message(
             f"You already have {item_name} equipped (you cannot equip the same essence more than once)."
         )
@@ -87,6 +87,11 @@ class Fighter(BaseComponent):
             death_message = f"{self.parent.name} is dead!"
             death_message_color = color.enemy_die
 
+        # take the actor off the map while it turns into a corpse, so the map's
+        # indexes pick up the change when it is put back
+        gamemap = self.gamemap
+        gamemap.remove_entity(self.parent)
+
         self.parent.char = "%"
         self.parent.color = (191, 0, 0)
         self.parent.blocks_movement = False
@@ -98,4 +103,6 @@ class Fighter(BaseComponent):
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
 
+        gamemap.add_entity(self.parent)
+
         self.engine.message_log.add_message(death_message, death_message_color)
@@ -0,0 +1,7 @@
+from base_enum import BaseEnum
+
+
+class IntentTypes(str, BaseEnum):
+    ATTACK = "attack"  # sees the player, and is next to them
+    APPROACH = "approach"  # sees the player, but is too far away to attack
+    IDLE = "idle"  # doesn't see the player
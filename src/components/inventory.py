@@ -14,6 +14,8 @@ class Inventory(BaseComponent):
     def __init__(self, capacity: int):
         self.capacity = capacity
         self.items: List[Item] = []
+        # bumped whenever items are added or removed
+        self.version = 0
 
     def add(self, item: Item, add_message: bool = True) -> None:
         """Adds an item to the inventory"""
@@ -23,20 +25,25 @@ class Inventory(BaseComponent):
             self.engine.message_log.add_message(f"{item.name} is too heavy to pick up.")
             return
 
-        if item in self.engine.game_map.entities:
-            self.engine.game_map.entities.remove(item)
+        self.engine.game_map.remove_entity(item)
         item.parent = self
         self.items.append(item)
+        self.version += 1
         self.parent.fighter.stats.carrying_capacity.modify(item.weight)
 
         if add_message:
             self.engine.message_log.add_message(f"You picked up the {item.name}!")
 
+    def remove(self, item: Item) -> None:
+        """Takes an item out of the inventory, without putting it anywhere."""
+        self.items.remove(item)
+        self.version += 1
+
     def drop(self, item: Item) -> None:
         """
         Removes an item from the inventory and restores it to the game map, at the player's current location.
         """
-        self.items.remove(item)
+        self.remove(item)
         item.place(self.parent.x, self.parent.y, self.gamemap)
 
         self.parent.fighter.stats.carrying_capacity.modify(-item.weight)
@@ -45,7 +52,7 @@ class Inventory(BaseComponent):
 
     def delete(self, item: Item, message: str = None) -> None:
         """Deletes an item permanently."""
-        self.items.remove(item)
+        self.remove(item)
 
         if message is not None:
             self.engine.message_log.add_message(message)
@@ -19,6 +19,8 @@ class CharacterStat:
         self.is_dirty = True  # True means that self._value needs to be recalculated (is not up to date)
         self.name = name
         self.dependents: list[CharacterStat] = []
+        # bumped every time this stat (or anything it depends on) changes
+        self.version = 0
         if self.is_complex:
             self.raw_base_value.dependents.append(self)
         self.get_dirty()
@@ -94,6 +96,7 @@ class CharacterStat:
 
     def get_dirty(self) -> None:
         self.is_dirty = True
+        self.version += 1
         for dep in self.dependents:
             dep.get_dirty()
 
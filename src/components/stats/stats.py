@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, overload, Dict, Optional, Tuple, List
+from typing import TYPE_CHECKING, overload, Dict, Iterator, Optional, Tuple, List
 from copy import deepcopy
 
 import consts
@@ -208,6 +208,34 @@ class Stats:
             self.flat_weapon_damage[damtype] = CharacterStat(base_value=0, name="BASE")
         self.flat_armor_defense = CharacterStat(base_value=0, name="BASE")
 
+    @property
+    def version(self) -> int:
+        """
+        Changes whenever any of this actor's own stats change, for caching anything
+        derived from them. The current values of resources (hp, energy...) are not
+        covered, only their maximums.
+        """
+        own_stats = self.__dict__.get("_own_stats")
+        if own_stats is None:
+            own_stats = self._own_stats = list(self._collect_own_stats())
+        # versions only ever go up, so the sum changes whenever one of them does
+        return sum(stat.version for stat in own_stats)
+
+    def _collect_own_stats(self) -> Iterator[CharacterStat]:
+        for container in (
+            self,
+            self.initiative,
+            self.damage_resists,
+            self.damage_amps,
+            self.damage_masteries,
+        ):
+            for value in vars(container).values():
+                if isinstance(value, CharacterStat):
+                    yield value
+                elif isinstance(value, Resource):
+                    yield value.max
+        yield from self.flat_weapon_damage.values()
+
     @property
     def attack(self) -> List[float]:
         weapon = self._resolve_weapon(self.unarmed_weapon)
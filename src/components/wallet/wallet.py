@@ -73,12 +73,12 @@ class Wallet(BaseComponent):
     # ---------- Messages ----------
     def add_message(self, amount: Dict[Currency, int]) -> None:
         for ctype, cval in amount.items():
-            self.parent.gamemap.engine.message_log.add_message(
+            self.engine.message_log.add_message(
                 f"You have received {cval} {ctype.value.upper()}."
             )
 
     def spend_message(self, amount: Dict[Currency, int]) -> None:
         for ctype, cval in amount.items():
-            self.parent.gamemap.engine.message_log.add_message(
+            self.engine.message_log.add_message(
                 f"You have spent {cval} {ctype.value.upper()}."
             )
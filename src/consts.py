@@ -15,6 +15,35 @@ SCREEN_HEIGHT = 72
 MAP_WIDTH = SCREEN_WIDTH
 MAP_HEIGHT = int(SCREEN_HEIGHT * 0.9)
 
+# if True, enemy turns the player can see are drawn as they happen instead of
+# only showing the end result, capped to this many frames per second
+ANIMATE_ENEMY_TURNS = False
+ENEMY_TURN_MAX_FPS = 30
+
+# the main loop draws a frame this many times per second, and spends at most this
+# many milliseconds of each frame collecting background work (generated maps)
+FRAME_RATE = 60
+BACKGROUND_BUDGET_MS = 4
+
+# the game is saved in the background this many seconds after the last save, 0 to
+# only save when quitting
+AUTOSAVE_INTERVAL = 120
+
+# how many recent fields of view each map keeps around
+FOV_CACHE_SIZE = 16
+
+SAVE_PATH = Path("savegame.sav")
+
+# how many recent messages the message log keeps in memory, older ones are
+# appended to MESSAGE_LOG_PATH (next to the save) and read back for the history
+MESSAGE_LOG_MEMORY = 512
+MESSAGE_LOG_PATH = Path("savegame.log")
+
+# how many frames the timing overlay (F3 in game) averages over, and where F4
+# streams the timings to
+FRAME_TIMING_WINDOW = 120
+FRAME_TIMING_CSV_PATH = Path("frame_timings.csv")
+
 # to convert from how initiative is stored to how it is used everywhere else
 # it is stored in a weird way to attempt to prevent floating point errors
 TRUE_INIT_FACTOR = int(1e4)
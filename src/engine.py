@@ -1,19 +1,21 @@
 from __future__ import annotations
 
-import lzma
-import pickle
-from typing import TYPE_CHECKING, Iterator, List
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
 from functools import cached_property
 
 from tcod.console import Console
-from tcod.map import compute_fov
 
 from actions import WaitAction
+from components.ai import path_stats, plan_intents, turn_stats
 import color
 import consts
 import exceptions
+from frame_timing import frame_timings
 from message_log import MessageLog
 import render_functions
+from row_model import RowModel
+import savefile
 
 if TYPE_CHECKING:
     from entity import Actor
@@ -30,6 +32,29 @@ class Engine:
         self.message_log = MessageLog()
         self.mouse_location = (0, 0)
         self.player = player
+        # whether the player could see the last enemy turn, before or after it acted
+        self.last_turn_visible = False
+        # how many turns the player has taken
+        self.turn = 0
+
+        # the HUD, and the values it was last drawn for. See render_hud
+        self._hud: Optional[Console] = None
+        self._hud_key: Optional[tuple] = None
+        # cached menu rows by section, see CharacterInformationHandler.cached_rows
+        self.row_models: Dict[str, RowModel] = {}
+
+    def __getstate__(self) -> dict:
+        # the HUD and the menu rows are rebuilt after loading
+        state = self.__dict__.copy()
+        state["_hud"] = state["_hud_key"] = None
+        state["row_models"] = {}
+        return state
+
+    def close(self) -> None:
+        """Stop the background work of this game, when it is quit or replaced."""
+        game_floor = getattr(getattr(self, "game_world", None), "game_floor", None)
+        if game_floor is not None:
+            game_floor.stop_worker()
 
     def only_handle_player(self) -> None:
         min_diff = (
@@ -90,47 +115,95 @@ class Engine:
             yield from self._handle_enemy_turns(turn_order=turn_order)
 
     def _handle_enemy_turns(self, turn_order: List[Actor]) -> Iterator[Entity]:
+        path_stats.new_turn()
+        intents = plan_intents(self, turn_order)
 
-        for entity in turn_order:
+        for entity, intent in zip(turn_order, intents):
             if entity.ai:
+                seen_before = self.game_map.visible[entity.x, entity.y]
+                turn_stats.turns += 1
                 try:
-                    entity.ai.perform()
+                    entity.ai.perform(intent)
                 except (
                     exceptions.Impossible
                 ):  # Ignore impossible action exceptions from AI.
+                    turn_stats.impossible += 1
                     WaitAction(entity).perform()
+                self.last_turn_visible = bool(
+                    seen_before or self.game_map.visible[entity.x, entity.y]
+                )
                 yield entity
 
     def update_fov(self) -> None:
         """Recompute the visible area based on the players point of view."""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
-            light_walls=True,
-        )
-        # If a tile is "visible" it should be added to "explored".
-        self.game_map.explored |= self.game_map.visible
+        with frame_timings.measure("update_fov"):
+            self.game_map.update_fov(self.player.x, self.player.y, radius=8)
 
     def render(self, console: Console) -> None:
-        self.game_map.render(console)
+        with frame_timings.measure("map_render"):
+            self.game_map.render(console)
+        self.render_hud(console)
+
+    def render_hud(self, console: Console) -> None:
+        """
+        Draw everything below the map.
+
+        The HUD is composed on its own console, which is only redrawn when something
+        it shows has changed, and blitted below the map every frame.
+        """
+        hud_y = self.game_map.height + 1
+        stats = self.player.fighter.stats
+        game_map = self.game_map
+        key = (
+            console.width,
+            console.height,
+            hud_y,
+            stats.hp.value,
+            stats.hp.max_value,
+            stats.energy.value,
+            stats.energy.max_value,
+            stats.mana.value,
+            stats.mana.max_value,
+            stats.initiative.initiative.value,
+            self.game_world.current_floor,
+            self.mouse_location,
+            id(game_map),
+            game_map.fov_version,
+            game_map.entities_version,
+            self.message_log.version,
+        )
+        if self._hud is None or key != self._hud_key:
+            size = console.width, console.height - hud_y
+            if self._hud is None or (self._hud.width, self._hud.height) != size:
+                self._hud = Console(*size, order="F")
+            else:
+                self._hud.clear()
+            self._draw_hud(self._hud, hud_y)
+            self._hud_key = key
 
-        render_functions.render_gui_frame(console=console, y=(self.game_map.height + 1))
+        self._hud.blit(console, 0, hud_y)
 
-        self.message_log.render(
-            console=console,
-            x=self.game_map.width - 40,
-            y=self.ui_start_y,
-            width=40,
-            height=self.ui_height,
-        )
+    def _draw_hud(self, hud: Console, hud_y: int) -> None:
+        """Draw the HUD onto `hud`, which is placed at `hud_y` on the screen."""
+        ui_y = self.ui_start_y - hud_y
+
+        render_functions.render_gui_frame(console=hud, y=0)
+
+        with frame_timings.measure("log_render"):
+            self.message_log.render(
+                console=hud,
+                x=self.game_map.width - 40,
+                y=ui_y,
+                width=40,
+                height=self.ui_height,
+            )
 
         render_functions.render_bar(
-            console=console,
+            console=hud,
             current_value=self.player.fighter.stats.hp.value,
             maximum_value=self.player.fighter.stats.hp.max_value,
             x=1,
-            y=(self.ui_start_y),
+            y=ui_y,
             bar_empty=color.bar_hp_empty,
             bar_filled=color.bar_hp,
             bar_text=color.bar_hp_text,
@@ -138,11 +211,11 @@ class Engine:
         )
 
         render_functions.render_bar(
-            console=console,
+            console=hud,
             current_value=self.player.fighter.stats.energy.value,
             maximum_value=self.player.fighter.stats.energy.max_value,
             x=1,
-            y=(self.ui_start_y + 1),
+            y=(ui_y + 1),
             bar_empty=color.bar_energy_empty,
             bar_filled=color.bar_energy,
             bar_text=color.bar_energy_text,
@@ -150,11 +223,11 @@ class Engine:
         )
 
         render_functions.render_bar(
-            console=console,
+            console=hud,
             current_value=self.player.fighter.stats.mana.value,
             maximum_value=self.player.fighter.stats.mana.max_value,
             x=1,
-            y=(self.ui_start_y + 2),
+            y=(ui_y + 2),
             bar_empty=color.bar_mana_empty,
             bar_filled=color.bar_mana,
             bar_text=color.bar_mana_text,
@@ -162,12 +235,12 @@ class Engine:
         )
 
         render_functions.render_bar(
-            console=console,
+            console=hud,
             current_value=self.player.fighter.stats.initiative.initiative.value
             / consts.TRUE_INIT_FACTOR,
             maximum_value=consts.MAX_INIT / consts.TRUE_INIT_FACTOR,
             x=1,
-            y=(self.ui_start_y + 3),
+            y=(ui_y + 3),
             bar_empty=color.bar_initiative_empty,
             bar_filled=color.bar_initiative,
             bar_text=color.bar_initiative_text,
@@ -175,24 +248,22 @@ class Engine:
         )
 
         render_functions.render_dungeon_level(
-            console=console,
+            console=hud,
             dungeon_level=self.game_world.current_floor,
             x=self.game_map.width - 47,
-            y=self.ui_start_y,
+            y=ui_y,
         )
 
         render_functions.render_names_at_mouse_location(
-            console=console,
+            console=hud,
             x=self.game_map.width - 40,
-            y=self.game_map.height + 2,
+            y=ui_y,
             engine=self,
         )
 
     def save_as(self, filename: str) -> None:
-        """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
+        """Save this Engine instance, see savefile.py."""
+        savefile.save(self, Path(filename))
 
     @cached_property
     def ui_start_y(self) -> int:
@@ -10,6 +10,7 @@ from render_order import RenderOrder
 
 
 if TYPE_CHECKING:
+    from engine import Engine
     from components.ai import BaseAI
     from components.consumable import Consumable
     from components.equipment import Equipment
@@ -30,8 +31,6 @@ if TYPE_CHECKING:
 
 class Entity:
 
-    parent: Union[GameMap, Inventory]
-
     def __init__(
         self,
         parent: Optional[GameMap] = None,
@@ -44,6 +43,10 @@ class Entity:
         blocks_movement: bool = False,
         render_order: RenderOrder = RenderOrder.CORPSE,
     ):
+        # the map this entity is on (directly, or through an inventory), bound whenever
+        # it is re-parented so that lookups don't have to walk the parent chain
+        self._gamemap: Optional[GameMap] = None
+
         self.x = x
         self.y = y
         self.char = char
@@ -58,11 +61,28 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
+
+    @property
+    def parent(self) -> Union[GameMap, Inventory]:
+        return self._parent
+
+    @parent.setter
+    def parent(self, parent: Union[GameMap, Inventory]) -> None:
+        self._parent = parent
+        self._bind(getattr(parent, "gamemap", None))
+
+    def _bind(self, gamemap: Optional[GameMap]) -> None:
+        """Point this entity (and anything it carries) at the map it is now on."""
+        self._gamemap = gamemap
 
     @property
     def gamemap(self) -> GameMap:
-        return self.parent.gamemap
+        return self._gamemap
+
+    @property
+    def engine(self) -> Engine:
+        return self._gamemap.engine
 
     def spawn(self, gamemap: GameMap, x: int, y: int) -> Self:
         """Spawn a copy of this instance at the given location."""
@@ -70,19 +90,28 @@ class Entity:
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entity at a new location.  Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
+        # Possibly uninitialized.
+        on_map = hasattr(self, "parent") and self.parent is self.gamemap
         if gamemap:
-            if hasattr(self, "parent"):  # Possibly uninitialized.
-                if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+            if on_map:
+                self.gamemap.remove_entity(self)
+            # GameMap(entities=...) adds entities without setting their parent, drop
+            # them from the index at their old location before adding them again
+            gamemap.remove_entity(self)
+            self.x = x
+            self.y = y
             self.parent = gamemap
-            gamemap.entities.add(self)
+            gamemap.add_entity(self)
+        elif on_map:
+            self.gamemap.move_entity(self, x, y)
+        else:
+            self.x = x
+            self.y = y
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -91,8 +120,7 @@ class Entity:
         return math.sqrt((x - self.x) ** 2 + (y - self.y) ** 2)
 
     def move(self, dx: int, dy: int) -> None:
-        self.x += dx
-        self.y += dy
+        self.gamemap.move_entity(self, self.x + dx, self.y + dy)
 
 
 class Actor(Entity):
@@ -151,6 +179,15 @@ class Actor(Entity):
         self.loot = loot
         self.loot.parent = self
 
+    def _bind(self, gamemap: Optional[GameMap]) -> None:
+        super()._bind(gamemap)
+        # carried items reach the map through this actor, so they move with it
+        for item in self.inventory.items:
+            item._bind(gamemap)
+        for item in self.essence.slots:
+            if item is not None:
+                item._bind(gamemap)
+
     @property
     def is_alive(self) -> bool:
         """Returns True as long as this actor can perform actions."""
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+import tcod
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+NEIGHBORS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+# how strongly fleeing actors prefer getting far away over the shortest escape route
+FLEE_FACTOR = 1.2
+
+
+class FlowField:
+    """
+    A Dijkstra distance map toward a single goal (usually the player), shared by
+    every actor heading there.
+
+    The map is only recomputed when the goal moves or the tiles change, so pathing
+    costs one Dijkstra pass per turn instead of one A* solve per monster. Blocking
+    entities are not part of the field, they are stepped around in next_step, so
+    monsters moving do not invalidate it.
+    """
+
+    def __init__(self, gamemap: GameMap):
+        self.gamemap = gamemap
+
+        self._key: Optional[Tuple[int, int, int]] = None
+        self._distance: Optional[npt.NDArray[np.int32]] = None
+        self._flee_distance: Optional[npt.NDArray[np.int32]] = None
+
+    def __getstate__(self) -> dict:
+        # the distance maps are rebuilt on demand, keep them out of saves
+        state = self.__dict__.copy()
+        state["_key"] = None
+        state["_distance"] = None
+        state["_flee_distance"] = None
+        return state
+
+    def update(self, goal_x: int, goal_y: int) -> None:
+        """Point the field at (goal_x, goal_y), recomputing it only if something changed."""
+        key = (goal_x, goal_y, self.gamemap.tiles_version)
+        if key == self._key:
+            return
+
+        cost = self.gamemap.walk_cost
+        distance = self._distance
+        if distance is None or distance.shape != cost.shape:
+            distance = tcod.path.maxarray(cost.shape, dtype=np.int32, order="F")
+        else:
+            distance[...] = np.iinfo(np.int32).max
+        distance[goal_x, goal_y] = 0
+        tcod.path.dijkstra2d(distance, cost, 2, 2, out=distance)
+
+        self._key = key
+        self._distance = distance
+        self._flee_distance = None
+
+    @property
+    def distance(self) -> npt.NDArray[np.int32]:
+        """Distance to the goal of every tile, unreachable tiles hold the int32 maximum."""
+        return self._distance
+
+    @property
+    def flee_distance(self) -> npt.NDArray[np.int32]:
+        """
+        The inverted field: walking downhill on it leads away from the goal, toward
+        the places that are furthest from it rather than just the nearest dead end.
+        """
+        if self._flee_distance is None:
+            unreachable = np.iinfo(np.int32).max
+            reachable = self._distance != unreachable
+            cost = self.gamemap.walk_cost
+
+            flee = np.full_like(self._distance, unreachable)
+            flee[reachable] = (-FLEE_FACTOR * self._distance[reachable]).astype(
+                np.int32
+            )
+            tcod.path.dijkstra2d(flee, cost, 2, 2, out=flee)
+            self._flee_distance = flee
+        return self._flee_distance
+
+    def next_step(
+        self, x: int, y: int, flee: bool = False
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Return the free neighboring tile of (x, y) that is furthest downhill, or
+        None if every downhill tile is blocked.
+
+        With `flee` the inverted field is used, leading away from the goal.
+        """
+        field = self.flee_distance if flee else self.distance
+        gamemap = self.gamemap
+
+        best = None
+        best_distance = field[x, y]
+        for dx, dy in NEIGHBORS:
+            nx, ny = x + dx, y + dy
+            if not gamemap.in_bounds(nx, ny) or field[nx, ny] >= best_distance:
+                continue
+            if gamemap.get_blocking_entity_at_location(nx, ny):
+                continue
+            best = nx, ny
+            best_distance = field[nx, ny]
+
+        return best
@@ -0,0 +1,159 @@
+"""Per-frame timings of the main subsystems, for the debug overlay in main.py."""
+
+from __future__ import annotations
+
+from collections import deque
+from contextlib import contextmanager, nullcontext
+import csv
+from pathlib import Path
+import time
+from typing import TYPE_CHECKING, Deque, Dict, Iterator, List, Optional, TextIO
+
+import color
+from components.ai import path_stats, turn_stats
+import consts
+
+if TYPE_CHECKING:
+    from tcod.console import Console
+    from engine import Engine
+
+# the sections shown on the overlay, in order
+SECTIONS = [
+    "on_render",
+    "enemy_turns",
+    "background",
+    "update_fov",
+    "map_render",
+    "log_render",
+    "present",
+]
+
+
+class FrameTimings:
+    """
+    Rolling per-frame timings of the SECTIONS, in milliseconds.
+
+    Code is timed by wrapping it in `with frame_timings.measure(section):`, which
+    costs next to nothing while timing is off. A frame's sample is the total time
+    spent in each section between two calls to end_frame. Samples can also be
+    streamed to a CSV file to compare builds.
+    """
+
+    def __init__(self, window: int = consts.FRAME_TIMING_WINDOW):
+        # whether the overlay is shown, timing is on while it is or a CSV is recording
+        self.overlay = False
+        self.samples: Dict[str, Deque[float]] = {
+            section: deque(maxlen=window) for section in SECTIONS + ["frame"]
+        }
+        # the latest sizes of the map generation queues, see GameFloor.generation_status
+        self.gen_queue = 0
+        self.ready_queue = 0
+
+        self._current: Dict[str, float] = dict.fromkeys(SECTIONS, 0.0)
+        self._frame_start = time.perf_counter()
+        self._frame_count = 0
+        self._csv_file: Optional[TextIO] = None
+        self._csv: Optional[csv.writer] = None
+
+    @property
+    def recording(self) -> bool:
+        return self._csv is not None
+
+    @property
+    def enabled(self) -> bool:
+        return self.overlay or self._csv is not None
+
+    def measure(self, section: str):
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(section)
+
+    @contextmanager
+    def _measure(self, section: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._current[section] += (time.perf_counter() - start) * 1000
+
+    def end_frame(self, engine: Optional[Engine] = None) -> None:
+        """Close the current frame's sample, and start the next one."""
+        now = time.perf_counter()
+        frame_time = (now - self._frame_start) * 1000
+        self._frame_start = now
+        if not self.enabled:
+            return
+
+        self.gen_queue, self.ready_queue = _generation_status(engine)
+        for section, total in self._current.items():
+            self.samples[section].append(total)
+            self._current[section] = 0.0
+        self.samples["frame"].append(frame_time)
+        self._frame_count += 1
+
+        if self._csv is not None:
+            self._csv.writerow(
+                [self._frame_count, f"{frame_time:.3f}"]
+                + [f"{self.samples[section][-1]:.3f}" for section in SECTIONS]
+                + [self.gen_queue, self.ready_queue]
+            )
+
+    def start_csv(self, path: Path = consts.FRAME_TIMING_CSV_PATH) -> None:
+        """Start appending every frame's sample to the CSV file at `path`."""
+        self.stop_csv()
+        new_file = not path.exists()
+        self._csv_file = path.open("a", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._csv_file)
+        if new_file:
+            self._csv.writerow(
+                ["frame", "frame_ms"]
+                + [f"{section}_ms" for section in SECTIONS]
+                + ["gen_queue", "ready_queue"]
+            )
+
+    def stop_csv(self) -> None:
+        if self._csv_file is not None:
+            self._csv_file.close()
+        self._csv_file = None
+        self._csv = None
+
+    def lines(self) -> List[str]:
+        """The overlay text: the average and worst time of every section."""
+        lines = [f"{'':<12}{'avg':>7}{'max':>7}"]
+        for section in ["frame"] + SECTIONS:
+            samples = self.samples[section]
+            if samples:
+                average = sum(samples) / len(samples)
+                lines.append(f"{section:<12}{average:>7.2f}{max(samples):>7.2f}")
+            else:
+                lines.append(f"{section:<12}{'-':>7}{'-':>7}")
+        lines.append(f"gen queue   {self.gen_queue:>7}")
+        lines.append(f"ready queue {self.ready_queue:>7}")
+        # monster turns that raised exceptions.Impossible, over the whole session
+        lines.append(f"imposs/1k   {turn_stats.impossible_per_thousand_turns:>7.2f}")
+        # monster paths solved from scratch and repaired in the last enemy turn
+        lines.append(f"paths full  {path_stats.last_turn_full:>7}")
+        lines.append(f"paths fixed {path_stats.last_turn_repaired:>7}")
+        if self.recording:
+            lines.append("recording CSV")
+        return lines
+
+    def render(self, console: Console, x: int = 1, y: int = 1) -> None:
+        lines = self.lines()
+        width = max(len(line) for line in lines) + 2
+        console.draw_frame(
+            x, y, width, len(lines) + 2, "frame ms", fg=color.white, bg=color.black
+        )
+        for i, line in enumerate(lines):
+            console.print(x + 1, y + 1 + i, line, fg=color.white)
+
+
+def _generation_status(engine: Optional[Engine]) -> tuple[int, int]:
+    game_world = getattr(engine, "game_world", None)
+    game_floor = getattr(game_world, "game_floor", None)
+    if game_floor is None:
+        return 0, 0
+    return game_floor.generation_status
+
+
+frame_timings = FrameTimings()
@@ -1,17 +1,25 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 import heapq
-from typing import TYPE_CHECKING, Iterable, Iterator, Optional, List, Tuple, Dict, 
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, List, Tuple, Dict
 import threading
+import time
 import queue
+import uuid
 
 
 import numpy as np
 import numpy.typing as npt
+import tcod
 from tcod.console import Console
+from tcod.map import compute_fov
 
 import consts
 from entity import Actor, Item
+from flow_field import FlowField
+from render_order import RenderOrder
+from spatial import EntityPositions, GlyphPositions
 import tile_types
 from procgen.load_floor_data import load_floor_data
 from procgen.generate_floor import generate_floor
@@ -21,16 +29,72 @@ if TYPE_CHECKING:
     from engine import Engine
     from entity import Entity
 
+# Added to the pathfinding cost of a walkable tile with a blocking entity on it.
+# A lower number means more enemies will crowd behind each other in
+# hallways.  A higher number means enemies will take longer paths in
+# order to surround the player.
+BLOCKING_PATH_COST = 10
+
 
 class GameMap:
 
     def __init__(
-        self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        entities: Iterable[Entity] = (),
+        tile_registry: tile_types.TileRegistry = tile_types.DEFAULT_REGISTRY,
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        # identifies this map in save files, see savefile.py
+        self.map_id = uuid.uuid4().hex
+        # the tiles are stored as ids into tile_registry, which holds everything else
+        self.tile_registry = tile_registry
+        self.tile_ids = np.full(
+            (width, height),
+            fill_value=tile_registry["wall"],
+            dtype=np.uint8,
+            order="F",
+        )
+        # bumped by set_tiles, so anything derived from the tiles knows when to refresh
+        self.tiles_version = 0
+
+        # occupancy index, kept up to date by add_entity, remove_entity and move_entity.
+        # blocking_ids holds the occupant id of the blocking entity on each tile (-1 if none)
+        self.blocking_ids = np.full(
+            (width, height), fill_value=-1, dtype=np.int32, order="F"
+        )
+        self._occupants: Dict[int, Entity] = {}
+        self._next_occupant_id = 0
+        self._item_buckets: Dict[Tuple[int, int], List[Item]] = {}
+
+        # pathfinding costs, built lazily for the current tiles_version.
+        # _path_cost also carries BLOCKING_PATH_COST on every walkable tile with a
+        # blocking entity, kept up to date by _index_entity and _unindex_entity
+        self._walk_cost: Optional[npt.NDArray[np.int8]] = None
+        self._path_cost: Optional[npt.NDArray[np.int8]] = None
+        self._path_cost_version = -1
+        self._pathfinder: Optional[tcod.path.Pathfinder] = None
+
+        # entities partitioned by kind, kept up to date by add_entity and remove_entity.
+        # dicts are used as insertion-ordered sets so iteration order is stable
+        self._live_actors: Dict[Actor, None] = {}
+        self._corpses: Dict[Actor, None] = {}
+        self._items: Dict[Item, None] = {}
+        # living actor positions as NumPy arrays, for the queries in spatial.py
+        self.actor_positions = EntityPositions()
+        # entities to draw, bucketed by render order
+        self.render_buckets: Dict[RenderOrder, GlyphPositions] = {
+            render_order: GlyphPositions() for render_order in RenderOrder
+        }
+
+        # bumped whenever an entity is added, removed or moved
+        self.entities_version = 0
+        self.entities: set[Entity] = set()
+        for entity in entities:
+            self.add_entity(entity)
 
         self.visible = np.full(
             (width, height), fill_value=False, order="F"
@@ -39,20 +103,147 @@ class GameMap:
             (width, height), fill_value=False, order="F"
         )  # Tiles the player has seen before
 
+        # recently computed FOVs, keyed by (x, y, radius), for the current tiles_version
+        self._fov_cache: OrderedDict[Tuple[int, int, int], npt.NDArray[np.bool]] = (
+            OrderedDict()
+        )
+        self._fov_cache_version = self.tiles_version
+        self._fov_key: Optional[Tuple[int, int, int, int]] = None
+        # bumped by update_fov whenever visible or explored change
+        self.fov_version = 0
+
+        # the composited tile layer drawn by render, along with the visible and
+        # explored masks it was built from and the (tiles_version, fov_version) it is
+        # current for
+        self._map_layer: Optional[npt.NDArray] = None
+        self._layer_visible: Optional[npt.NDArray[np.bool]] = None
+        self._layer_explored: Optional[npt.NDArray[np.bool]] = None
+        self._layer_diff: Optional[npt.NDArray[np.bool]] = None
+        self._layer_key: Optional[Tuple[int, int]] = None
+
+        # distance map toward the player, shared by every hostile AI on this map
+        self.flow_field = FlowField(self)
+
         self.upstairs_location = (0, 0)
 
+    def __getstate__(self) -> dict:
+        # the FOV cache is cheap to rebuild, keep it out of saves
+        state = self.__dict__.copy()
+        state["_fov_cache"] = OrderedDict()
+        # same for the pathfinding costs, and the pathfinder can't be pickled at all
+        state["_walk_cost"] = state["_path_cost"] = state["_pathfinder"] = None
+        state["_path_cost_version"] = -1
+        # and the composited map layer
+        state["_map_layer"] = state["_layer_visible"] = state["_layer_diff"] = None
+        state["_layer_explored"] = state["_layer_key"] = None
+        return state
+
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    @property
+    def save_version(self) -> Tuple[int, int, int]:
+        """Changes whenever the tiles, the entities on them or the FOV change."""
+        return self.tiles_version, self.entities_version, self.fov_version
+
+    def set_tiles(self, index, tile: str) -> None:
+        """Set the tiles at `index` to the registered tile named `tile`."""
+        self.tile_ids[index] = self.tile_registry[tile]
+        self.tiles_version += 1
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        return bool(self.tile_registry.walkable[self.tile_ids[x, y]])
+
+    @property
+    def walkable(self) -> npt.NDArray[np.bool]:
+        return self.tile_registry.walkable[self.tile_ids]
+
+    @property
+    def transparent(self) -> npt.NDArray[np.bool]:
+        return self.tile_registry.transparent[self.tile_ids]
+
+    def _refresh_path_costs(self) -> None:
+        if self._path_cost_version == self.tiles_version:
+            return
+
+        self._walk_cost = np.array(self.walkable, dtype=np.int8, order="F")
+        self._path_cost = self._walk_cost.copy(order="F")
+        self._path_cost[self.blocking_mask & (self._path_cost > 0)] += (
+            BLOCKING_PATH_COST
+        )
+        self._path_cost_version = self.tiles_version
+        self._pathfinder = None
+
+    @property
+    def walk_cost(self) -> npt.NDArray[np.int8]:
+        """Cost array of the tiles alone: 1 where walkable, 0 where not. Read-only."""
+        self._refresh_path_costs()
+        return self._walk_cost
+
+    @property
+    def path_cost(self) -> npt.NDArray[np.int8]:
+        """walk_cost with the blocking entity penalty on top. Read-only."""
+        self._refresh_path_costs()
+        return self._path_cost
+
+    def pathfinder(self) -> tcod.path.Pathfinder:
+        """
+        Return a cleared pathfinder over `path_cost`.
+
+        The graph and pathfinder are reused between calls until the tiles change.
+        Add a root and solve before asking for another one.
+        """
+        cost = self.path_cost
+        if self._pathfinder is None:
+            graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=2)
+            self._pathfinder = tcod.path.Pathfinder(graph)
+        else:
+            self._pathfinder.clear()
+        return self._pathfinder
+
+    def update_fov(self, x: int, y: int, radius: int) -> None:
+        """
+        Recompute the visible area from (x, y), and add it to the explored area.
+
+        Does nothing if neither the viewer nor the tiles changed since the last call,
+        and reuses the last few FOVs when the viewer returns to a recent position.
+        """
+        key = (x, y, radius, self.tiles_version)
+        if key == self._fov_key:
+            return
+
+        if self._fov_cache_version != self.tiles_version:
+            self._fov_cache.clear()
+            self._fov_cache_version = self.tiles_version
+
+        fov = self._fov_cache.get((x, y, radius))
+        if fov is None:
+            fov = compute_fov(
+                self.transparent, (x, y), radius=radius, light_walls=True
+            )
+            self._fov_cache[x, y, radius] = fov
+            if len(self._fov_cache) > consts.FOV_CACHE_SIZE:
+                self._fov_cache.popitem(last=False)
+        else:
+            self._fov_cache.move_to_end((x, y, radius))
+
+        self.visible[:] = fov
+        # If a tile is "visible" it should be added to "explored".
+        self.explored |= fov
+        self._fov_key = key
+        self.fov_version += 1
+
     @property
     def actors(self) -> Iterator[Actor]:
         """Iterate over this maps living actors."""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+        # iterate over a copy, actors can die (and change registry) mid-iteration
+        yield from (actor for actor in list(self._live_actors) if actor.is_alive)
+
+    @property
+    def corpses(self) -> Iterator[Actor]:
+        """Iterate over this maps dead actors."""
+        yield from list(self._corpses)
 
     @property
     def sorted_actors_by_initiative(self) -> List[Actor]:
@@ -65,34 +256,157 @@ class GameMap:
 
     @property
     def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+        yield from list(self._items)
+
+    @property
+    def blocking_mask(self) -> npt.NDArray[np.bool]:
+        """True wherever an entity blocks movement."""
+        return self.blocking_ids >= 0
+
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map at its current location."""
+        self.entities.add(entity)
+        registry = self._registry_for(entity)
+        if registry is not None:
+            registry[entity] = None
+        if registry is self._live_actors:
+            self.actor_positions.add(entity)
+        self.render_buckets[entity.render_order].add(entity)
+        self._index_entity(entity)
+        self.entities_version += 1
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map, if it is on it."""
+        if entity not in self.entities:
+            return
+        self.entities.remove(entity)
+        for registry in (self._live_actors, self._corpses, self._items):
+            registry.pop(entity, None)
+        self.actor_positions.remove(entity)
+        self.render_buckets[entity.render_order].remove(entity)
+        self._unindex_entity(entity)
+        self.entities_version += 1
+
+    def move_entity(self, entity: Entity, x: int, y: int) -> None:
+        """Move an entity that is on this map to a new location."""
+        self._unindex_entity(entity)
+        entity.x = x
+        entity.y = y
+        if entity in self.actor_positions:
+            self.actor_positions.move(entity)
+        self.render_buckets[entity.render_order].move(entity)
+        self._index_entity(entity)
+        self.entities_version += 1
+
+    def _registry_for(self, entity: Entity) -> Optional[Dict[Entity, None]]:
+        if isinstance(entity, Actor):
+            return self._live_actors if entity.is_alive else self._corpses
+        if isinstance(entity, Item):
+            return self._items
+        return None
+
+    def _index_entity(self, entity: Entity) -> None:
+        if entity.blocks_movement:
+            occupant_id = self._next_occupant_id
+            self._next_occupant_id += 1
+            self._occupants[occupant_id] = entity
+            if self.blocking_ids[entity.x, entity.y] < 0:
+                self._add_blocking_cost(entity.x, entity.y, BLOCKING_PATH_COST)
+            self.blocking_ids[entity.x, entity.y] = occupant_id
+        elif isinstance(entity, Item):
+            self._item_buckets.setdefault((entity.x, entity.y), []).append(entity)
+
+    def _unindex_entity(self, entity: Entity) -> None:
+        if entity.blocks_movement:
+            occupant_id = int(self.blocking_ids[entity.x, entity.y])
+            if self._occupants.get(occupant_id) is entity:
+                del self._occupants[occupant_id]
+                self.blocking_ids[entity.x, entity.y] = -1
+                self._add_blocking_cost(entity.x, entity.y, -BLOCKING_PATH_COST)
+        elif isinstance(entity, Item):
+            bucket = self._item_buckets.get((entity.x, entity.y))
+            if bucket and entity in bucket:
+                bucket.remove(entity)
+                if not bucket:
+                    del self._item_buckets[entity.x, entity.y]
+
+    def _add_blocking_cost(self, x: int, y: int, amount: int) -> None:
+        if self._path_cost_version == self.tiles_version and self._path_cost[x, y]:
+            self._path_cost[x, y] += amount
 
     def get_blocking_entity_at_location(
         self,
         location_x: int,
         location_y: int,
     ) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
-                return entity
-
-        return None
+        if not self.in_bounds(location_x, location_y):
+            return None
+        occupant_id = self.blocking_ids[location_x, location_y]
+        if occupant_id < 0:
+            return None
+        return self._occupants[int(occupant_id)]
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        entity = self.get_blocking_entity_at_location(x, y)
+        if isinstance(entity, Actor) and entity.is_alive:
+            return entity
 
         return None
 
+    def get_items_at_location(self, x: int, y: int) -> List[Item]:
+        return list(self._item_buckets.get((x, y), ()))
+
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if x and y are inside of the bounds of this map."""
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def _refresh_map_layer(self) -> None:
+        """
+        Bring the composited tile layer up to date.
+
+        The whole layer is only rebuilt when the tiles change. Otherwise just the tiles
+        whose visible or explored flag changed since the last refresh are recomposited.
+        Both are compared, as the FOV can be updated several times between renders.
+        """
+        key = (self.tiles_version, self.fov_version)
+        if key == self._layer_key:
+            return
+
+        if self._map_layer is None or self._layer_key[0] != self.tiles_version:
+            if self._map_layer is None:
+                shape = (self.width, self.height)
+                self._map_layer = np.empty(
+                    shape, dtype=tile_types.graphic_dt, order="F"
+                )
+                self._layer_visible = np.empty(shape, dtype=bool, order="F")
+                self._layer_explored = np.empty(shape, dtype=bool, order="F")
+                self._layer_diff = np.empty(shape, dtype=bool, order="F")
+            registry = self.tile_registry
+            self._map_layer[...] = np.select(
+                condlist=[self.visible, self.explored],
+                choicelist=[
+                    registry.light[self.tile_ids],
+                    registry.dark[self.tile_ids],
+                ],
+                default=tile_types.SHROUD,
+            )
+        else:
+            changed = np.not_equal(
+                self.visible, self._layer_visible, out=self._layer_diff
+            )
+            changed |= self.explored != self._layer_explored
+            xs, ys = np.nonzero(changed)
+            tiles = self.tile_registry.tiles[self.tile_ids[xs, ys]]
+            self._map_layer[xs, ys] = np.where(
+                self.visible[xs, ys],
+                tiles["light"],
+                np.where(self.explored[xs, ys], tiles["dark"], tile_types.SHROUD),
+            )
+
+        self._layer_visible[...] = self.visible
+        self._layer_explored[...] = self.explored
+        self._layer_key = key
+
     def render(self, console: Console) -> None:
         """
         Renders the map.
@@ -101,20 +415,27 @@ class GameMap:
         If it isn't, but it's in the "explored" array, then draw it with the "dark" colors.
         Otherwise, the default is "SHROUD".
         """
-        console.rgb[0 : self.width, 0 : self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.SHROUD,
-        )
+        self._refresh_map_layer()
+        console.rgb[0 : self.width, 0 : self.height] = self._map_layer
+
+        # Draw the entities in the FOV, one render order at a time so that
+        # higher orders are drawn on top.
+        for render_order in RenderOrder:
+            bucket = self.render_buckets[render_order]
+            slots = bucket.visible_slots(self.visible)
+            xs, ys = bucket.xy[slots, 0], bucket.xy[slots, 1]
+            console.rgb["ch"][xs, ys] = bucket.ch[slots]
+            console.rgb["fg"][xs, ys] = bucket.fg[slots]
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
-        )
 
-        for entity in entities_sorted_for_rendering:
-            # Only print entities that are in the FOV
-            if self.visible[entity.x, entity.y]:
-                console.print(x=entity.x, y=entity.y, text=entity.char, fg=entity.color)
+# the GameFloor attributes that belong to the generation worker
+WORKER_ATTRIBUTES = (
+    "_request_lock",
+    "_requested",
+    "_ready_queue",
+    "_stop_event",
+    "_worker",
+)
 
 
 class GameFloor:
@@ -155,14 +476,36 @@ class GameFloor:
         # generation order
         self._gen_queue: list[tuple[int, tuple[int, int]]] = []
 
+        self._start_worker()
+
+    def __getstate__(self) -> dict:
+        # the worker and what it synchronizes with can't be pickled, they are
+        # restarted on load. Maps it finished should be collected before saving
+        state = self.__dict__.copy()
+        for name in WORKER_ATTRIBUTES:
+            del state[name]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._start_worker()
+
+    def _start_worker(self) -> None:
         # threading stuff
         self._request_lock = threading.Lock()
+        # signalled when maps are requested, so the worker sleeps while there are none
+        self._requested = threading.Condition(self._request_lock)
         self._ready_queue = queue.Queue()
         self._stop_event = threading.Event()
 
         self._worker = threading.Thread(target=self._generation_worker, daemon=True)
         self._worker.start()
 
+    @property
+    def generation_status(self) -> Tuple[int, int]:
+        """How many maps are waiting to be generated, and how many to be collected."""
+        return len(self._gen_queue), self._ready_queue.qsize()
+
     def request_nearby_maps(self, radius: int = 99) -> None:
         px, py = self.player_location
 
@@ -175,12 +518,24 @@ class GameFloor:
                     d = abs(x - px) + abs(y - py)
                     if d <= radius:
                         heapq.heappush(self._gen_queue, (d, (x, y)))
+            self._requested.notify()
+
+    def stop_worker(self) -> None:
+        """
+        Stop the generation worker once it finishes the map it is on, if any. Floors
+        that are left behind must be stopped, the worker keeps them alive otherwise.
+        """
+        with self._requested:
+            self._stop_event.set()
+            self._requested.notify_all()
 
     def _generation_worker(self) -> None:
         while not self._stop_event.is_set():
-            with self._request_lock:
-                if not self._gen_queue:
-                    continue
+            with self._requested:
+                while not self._gen_queue and not self._stop_event.is_set():
+                    self._requested.wait()
+                if self._stop_event.is_set():
+                    return
                 _, (x, y) = heapq.heappop(self._gen_queue)
 
             # Double-check after popping
@@ -191,8 +546,14 @@ class GameFloor:
 
             self._ready_queue.put((x, y, gamemap))
 
-    def process_ready_maps(self) -> None:
+    def process_ready_maps(self, deadline: Optional[float] = None) -> None:
+        """
+        Move the maps the worker finished into the floor. With a `deadline` (a
+        time.perf_counter value) the rest are left for later once it passes.
+        """
         while not self._ready_queue.empty():
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
             x, y, gamemap = self._ready_queue.get()
             self.floor[x, y] = gamemap
 
@@ -253,4 +614,6 @@ class GameWorld:
     def generate_floor(self) -> None:
         floor_args = generate_floor(self.current_floor)
         floor_args["parent"] = self
+        if self.game_floor is not None:
+            self.game_floor.stop_worker()
         self.game_floor = GameFloor(**floor_args)
@@ -0,0 +1,327 @@
+"""
+Run the game without a window, for automated performance runs.
+
+A scripted player drives a new game through the same handlers main.py uses, and the
+run reports turns per second, the time spent per player action and per frame drawn,
+and peak memory.
+Run it from the repository root, like main.py:
+
+    python src/headless.py --actions 2000 --seed 1
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, List, Optional
+
+import tcod
+
+from components.ai import path_stats, turn_stats
+import consts
+from input_handlers import (
+    BaseEventHandler,
+    EventHandler,
+    GameOverEventHandler,
+    LevelUpEventHandler,
+    MainGameEventHandler,
+)
+import setup_game
+import spatial
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+# the keys the scripted player uses, one per direction
+DIRECTION_KEYS = {
+    (0, -1): tcod.event.KeySym.UP,
+    (0, 1): tcod.event.KeySym.DOWN,
+    (-1, 0): tcod.event.KeySym.LEFT,
+    (1, 0): tcod.event.KeySym.RIGHT,
+    (-1, -1): tcod.event.KeySym.HOME,
+    (-1, 1): tcod.event.KeySym.END,
+    (1, -1): tcod.event.KeySym.PAGEUP,
+    (1, 1): tcod.event.KeySym.PAGEDOWN,
+}
+LEVEL_UP_KEYS = [
+    tcod.event.KeySym.N1,
+    tcod.event.KeySym.N2,
+    tcod.event.KeySym.N3,
+    tcod.event.KeySym.N4,
+    tcod.event.KeySym.N5,
+    tcod.event.KeySym.N6,
+]
+# chances of the scripted player waiting a turn, or resting 100 turns, when it has
+# nothing in sight
+WAIT_CHANCE = 0.1
+REST_CHANCE = 0.02
+
+
+def key_down(
+    sym: tcod.event.KeySym, mod: tcod.event.Modifier = tcod.event.Modifier.NONE
+) -> tcod.event.KeyDown:
+    return tcod.event.KeyDown(scancode=0, sym=sym, mod=mod)
+
+
+def dispatch(
+    handler: BaseEventHandler,
+    event: tcod.event.Event,
+    console: Optional[tcod.console.Console],
+) -> BaseEventHandler:
+    """Feed `event` to `handler` the way main.main does, and return the next handler."""
+    if isinstance(handler, EventHandler):
+        return handler.handle_events(event, console)
+    return handler.handle_events(event)
+
+
+def render(handler: BaseEventHandler, console: Optional[tcod.console.Console]) -> None:
+    """Draw a frame like main.main does, minus presenting it."""
+    if console is not None:
+        console.clear()
+        handler.on_render(console=console)
+
+
+class HeadlessSession:
+    """
+    A game driven without a window: events go through the handlers like in main.main,
+    and frames are drawn to an offscreen console, or not at all if `console` is None.
+
+    Loop handlers (resting) are ticked until they hand control back, one frame per
+    tick, so a single event can cover many turns. `ticks` counts them.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        handler: BaseEventHandler,
+        console: Optional[tcod.console.Console],
+    ):
+        self.engine = engine
+        self.handler = handler
+        self.console = console
+        self.ticks = 0
+        # how long the handlers took with the last event, not counting drawing the
+        # frame after it, and how long every frame took to draw
+        self.event_ms = 0.0
+        self.render_ms: List[float] = []
+
+    def send(self, event: tcod.event.Event) -> BaseEventHandler:
+        start = time.perf_counter()
+        handler = dispatch(self.handler, event, self.console)
+        self.event_ms = (time.perf_counter() - start) * 1000
+        self.draw(handler)
+        while handler.ticking:
+            handler = handler.tick(self.console)
+            self.ticks += 1
+            self.draw(handler)
+        self.handler = handler
+        return handler
+
+    def draw(self, handler: BaseEventHandler) -> None:
+        if self.console is not None:
+            start = time.perf_counter()
+            render(handler, self.console)
+            self.render_ms.append((time.perf_counter() - start) * 1000)
+
+
+def new_session(
+    seed: int, render_frames: bool = True, spill_path: Optional[Path] = None
+) -> HeadlessSession:
+    """
+    Start a new game with the global RNG seeded by `seed`.
+
+    Messages spill to `spill_path` rather than next to a real save, the default is a
+    file in the temp directory.
+    """
+    random.seed(seed)
+    engine = setup_game.new_game()
+    if spill_path is None:
+        spill_path = Path(tempfile.gettempdir()) / f"headless-{seed}.log"
+    engine.message_log.spill_path = spill_path
+
+    console = None
+    if render_frames:
+        console = tcod.console.Console(
+            consts.SCREEN_WIDTH, consts.SCREEN_HEIGHT, order="F"
+        )
+    session = HeadlessSession(engine, MainGameEventHandler(engine), console)
+    session.draw(session.handler)
+    return session
+
+
+class ScriptedPlayer:
+    """
+    Picks the next key press: walk toward the nearest visible monster and fight it,
+    otherwise wander, wait or rest. Its choices use their own RNG, so a seed gives the
+    same run every time.
+    """
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.heading = self.rng.choice(list(DIRECTION_KEYS))
+
+    def next_events(self, handler: BaseEventHandler) -> List[tcod.event.KeyDown]:
+        if isinstance(handler, LevelUpEventHandler):
+            return [key_down(self.rng.choice(LEVEL_UP_KEYS))]
+        if not isinstance(handler, MainGameEventHandler):
+            return [key_down(tcod.event.KeySym.ESCAPE)]
+
+        engine = handler.engine
+        player = engine.player
+        target = spatial.nearest_visible_actor(
+            engine.game_map, player.x, player.y, consts.MAP_WIDTH, exclude=player
+        )
+        if target is not None:
+            step = _sign(target.x - player.x), _sign(target.y - player.y)
+            return [key_down(DIRECTION_KEYS[step])]
+
+        roll = self.rng.random()
+        if roll < REST_CHANCE:
+            return [
+                key_down(tcod.event.KeySym.S, tcod.event.Modifier.LSHIFT),
+                key_down(tcod.event.KeySym.N1),
+            ]
+        if roll < REST_CHANCE + WAIT_CHANCE:
+            return [key_down(tcod.event.KeySym.PERIOD)]
+
+        dx, dy = self.heading
+        if not engine.game_map.is_walkable(player.x + dx, player.y + dy):
+            self.heading = self.rng.choice(list(DIRECTION_KEYS))
+        return [key_down(DIRECTION_KEYS[self.heading])]
+
+
+def _sign(value: int) -> int:
+    return (value > 0) - (value < 0)
+
+
+@dataclass
+class RunReport:
+    # every turn spent resting counts as an action, but only the others are timed
+    actions: int = 0
+    rest_turns: int = 0
+    events: int = 0
+    monster_turns: int = 0
+    # monster turns that raised exceptions.Impossible, see TurnStats
+    impossible: int = 0
+    # monster paths solved from scratch and repaired, see PathStats
+    paths_full: int = 0
+    paths_repaired: int = 0
+    seconds: float = 0.0
+    action_ms: List[float] = field(default_factory=list)
+    render_ms: List[float] = field(default_factory=list)
+    peak_memory_mb: Optional[float] = None
+    game_over: bool = False
+
+    def lines(self) -> List[str]:
+        impossible_rate = self.impossible * 1000 / max(self.monster_turns, 1)
+        lines = [
+            f"player actions   {self.actions} ({self.rest_turns} resting)",
+            f"events           {self.events}",
+            f"monster turns    {self.monster_turns}",
+            f"impossible/1k    {impossible_rate:.2f} ({self.impossible} monster turns)",
+            f"paths            {self.paths_full} full, {self.paths_repaired} repaired",
+            f"wall time        {self.seconds:.2f} s",
+            f"turns/sec        {self.actions / max(self.seconds, 1e-9):.1f}",
+        ]
+        for name, samples in (("action", self.action_ms), ("frame", self.render_ms)):
+            if samples:
+                lines.append(
+                    f"{'ms per ' + name:<17}mean {statistics.fmean(samples):.3f}"
+                    f"  median {statistics.median(samples):.3f}"
+                    f"  max {max(samples):.3f}"
+                )
+        if self.peak_memory_mb is not None:
+            lines.append(f"peak memory      {self.peak_memory_mb:.1f} MB")
+        if self.game_over:
+            lines.append("the player died before the run finished")
+        return lines
+
+
+def run(
+    actions: int, seed: int = 0, render_frames: bool = True, trace_memory: bool = False
+) -> RunReport:
+    """
+    Play `actions` player turns with the ScriptedPlayer and measure them.
+
+    Peak memory is the resident set size where the OS reports it, `trace_memory` uses
+    tracemalloc instead, which is portable but slows everything down.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    session = new_session(seed, render_frames)
+    player = ScriptedPlayer(seed)
+    report = RunReport()
+    monster_turns, impossible = turn_stats.turns, turn_stats.impossible
+    paths_full, paths_repaired = path_stats.full, path_stats.repaired
+
+    start = time.perf_counter()
+    while report.actions < actions:
+        for event in player.next_events(session.handler):
+            turn, ticks = session.engine.turn, session.ticks
+            handler = session.send(event)
+            report.events += 1
+
+            turns = session.engine.turn - turn
+            report.actions += turns
+            if session.ticks != ticks:
+                report.rest_turns += turns
+            elif turns:
+                report.action_ms.append(session.event_ms)
+            if isinstance(handler, GameOverEventHandler):
+                report.game_over = True
+                break
+        if report.game_over:
+            break
+    report.seconds = time.perf_counter() - start
+    report.monster_turns = turn_stats.turns - monster_turns
+    report.impossible = turn_stats.impossible - impossible
+    report.paths_full = path_stats.full - paths_full
+    report.paths_repaired = path_stats.repaired - paths_repaired
+    report.render_ms = session.render_ms
+    session.engine.close()
+
+    if trace_memory:
+        report.peak_memory_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    else:
+        report.peak_memory_mb = _peak_rss_mb()
+    return report
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--actions", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-render", action="store_true", help="skip drawing frames entirely"
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="measure peak memory with tracemalloc instead of the OS",
+    )
+    args = parser.parse_args()
+
+    report = run(args.actions, args.seed, not args.no_render, args.trace_memory)
+    print("\n".join(report.lines()))
+
+
+if __name__ == "__main__":
+    main()
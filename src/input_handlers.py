@@ -1,8 +1,6 @@
 from __future__ import annotations
 
-from pathlib import Path
-
-from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union, Dict, List
+from typing import Callable, Hashable, Optional, Tuple, TYPE_CHECKING, Union, Dict, List
 import math
 
 import tcod
@@ -15,11 +13,15 @@ import menu_text
 from menu_text import StatDescriptor, StatRow, InventoryRow
 import exceptions
 from entity import Item
+from frame_timing import frame_timings
 from components.stats.stat_types import StatTypes
 from components.stats.damage_types import DamageTypes
 from components.stats.stat_mod_types import StatModType
 from render_functions import round_for_display
 import render_functions
+import savefile
+from render_policy import RenderPolicy
+from row_model import RowModel
 from components.stats import combat_stat_types
 from components.stats.resource import Resource
 from components.equipment_types import EquipmentTypes
@@ -93,6 +95,9 @@ MainGameEventHandler will become the active handler.
 
 class BaseEventHandler:
 
+    # whether the main loop calls tick every frame
+    ticking = False
+
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
         """Handle an event and return the next active event handler."""
         state = self.handle_event(event)
@@ -117,6 +122,10 @@ class BaseEventHandler:
     def on_render(self, console: tcod.Console) -> None:
         raise NotImplementedError()
 
+    def tick(self, console: tcod.console.Console) -> BaseEventHandler:
+        """Advance a long-running handler by one frame, return the next handler."""
+        return self
+
 
 class PopupMessage(BaseEventHandler):
     """Display a popup text window."""
@@ -189,6 +198,9 @@ class AreYouSureToDeleteSave(PopupMessage):
 class EventHandler(BaseEventHandler):
     """Base interface for input handlers."""
 
+    # shared by every handler, the main loop binds its `present` callback
+    render_policy = RenderPolicy()
+
     def __init__(self, engine: Engine):
         self.engine = engine
 
@@ -224,15 +236,25 @@ class EventHandler(BaseEventHandler):
         except exceptions.Impossible as exc:
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             return False  # Skip enemy turn on exceptions.
-        for _ in self.engine.handle_enemy_turns():
-            self.engine.update_fov()
-            if console:
-                self.on_render(console)
-        self.engine.update_fov()
-        if console:
-            self.on_render(console)
+        self.engine.turn += 1
+        self.resolve_enemy_turns(console)
         return True
 
+    def resolve_enemy_turns(self, console: tcod.console.Console = None) -> None:
+        """Run the enemy turns that are due.
+
+        Only the player can change the field of view, so it is updated once up front.
+        Intermediate frames are drawn only when the render policy will present them;
+        otherwise the main loop renders the final state.
+        """
+        self.engine.update_fov()
+        with frame_timings.measure("enemy_turns"):
+            for entity in self.engine.handle_enemy_turns():
+                if console is not None and self.render_policy.wants_frame(
+                    self.engine, entity
+                ):
+                    self.render_policy.present_frame(self, console)
+
     def _handle_key(self, event: tcod.event.KeyDown) -> Optional[Action]:
         raise NotImplementedError()
 
@@ -420,6 +442,8 @@ class CharacterScreenEventHandler(AskUserEventHandler):
 
 
 class LoopHandler(EventHandler):
+    ticking = True
+
     def __init__(self, engine, remaining_time: int, until_full: bool = False):
         super().__init__(engine)
         self.remaining_time = remaining_time
@@ -449,17 +473,14 @@ class LoopHandler(EventHandler):
             return MainGameEventHandler(self.engine)
 
         time_spent = self.perform(quick=self.quick)
+        self.engine.turn += 1
         if self.remaining_time is not None:
             self.remaining_time -= time_spent
 
         if self.quick:
             self.engine.only_handle_player()
         else:
-            for _ in self.engine.handle_enemy_turns():
-                self.on_render(console)
-                self.engine.update_fov()
-        self.on_render(console)
-        self.engine.update_fov()
+            self.resolve_enemy_turns(console)
 
         return self
 
@@ -581,6 +602,13 @@ class CharacterInformationHandler(AskUserEventHandler):
         self.text_y = self.subtabs_y + 3
         self.menu_width = 24
 
+    def cached_rows(self, name: str, key: Hashable, build: Callable[[], list]) -> list:
+        """The rows of section `name`, only rebuilt with `build` when `key` changes."""
+        model = self.engine.row_models.get(name)
+        if model is None:
+            model = self.engine.row_models[name] = RowModel()
+        return model.get(key, build)
+
     def move_tab_cursor(self, delta: int) -> None:
         n = len(self.TABS_NAMES)
         self.SELECTED_TAB = (self.SELECTED_TAB + delta) % n
@@ -629,6 +657,28 @@ class CharacterStatsHandler(CharacterInformationHandler):
     BASE_STATS_DESCRIPTIONS = menu_text.BASE_STAT_DESCRIPTIONS
     DAMAGE_STAT_DESCRIPTIONS = menu_text.DAMAGE_STAT_DESCRIPTIONS
     COMBAT_STAT_DESCRIPTIONS = menu_text.COMBAT_TEXT_DESCRIPTIONS
+    BASE_ATTRIBUTES = [
+        StatTypes.STRENGTH,
+        StatTypes.DEXTERITY,
+        StatTypes.CONSTITUTION,
+        StatTypes.INTELLIGENCE,
+        StatTypes.CUNNING,
+        StatTypes.WILLPOWER,
+    ]
+    # None is a spacer
+    RESOURCE_ORDER = [
+        StatTypes.HP,
+        StatTypes.HP_REGEN,
+        None,
+        StatTypes.ENERGY,
+        StatTypes.ENERGY_REGEN,
+        None,
+        StatTypes.MANA,
+        StatTypes.MANA_REGEN,
+        None,
+        StatTypes.CARRYING_CAPACITY,
+        StatTypes.ENCUMBRANCE,
+    ]
 
     def __init__(self, engine):
         super().__init__(
@@ -640,31 +690,57 @@ class CharacterStatsHandler(CharacterInformationHandler):
         )
 
         self.base_stat_rows: list[StatRow] = []
-        self._build_base_stat_rows()
         self.damage_stat_rows: list[StatRow] = []
-        self._build_damage_stat_rows()
         self.combat_stat_rows: list[StatRow] = []
-        self._build_combat_stat_rows()
+        self.refresh_stat_rows()
+
+    def refresh_stat_rows(self) -> None:
+        """
+        Bring the stat rows up to date. Each section is only rebuilt when the stats
+        (or equipment) it shows have changed since it was last built.
+        """
+        player = self.engine.player
+        stats = player.fighter.stats
+
+        attributes_key = tuple(
+            stats.get_stat(stat_type).version for stat_type in self.BASE_ATTRIBUTES
+        )
+        resources_key = tuple(
+            (stat.value, stat.max_value) if isinstance(stat, Resource) else stat.version
+            for stat in (
+                getattr(stats, stat_type.normalized)
+                for stat_type in self.RESOURCE_ORDER
+                if stat_type is not None
+            )
+        )
+        self.base_stat_rows = (
+            [StatRow(None, "ATTRIBUTES", "", selectable=False)]
+            + self.cached_rows(
+                "stats.attributes", attributes_key, self._build_attribute_rows
+            )
+            + [
+                StatRow(None, "", "", selectable=False),
+                StatRow(None, "RESOURCES", "", selectable=False),
+            ]
+            + self.cached_rows(
+                "stats.resources", resources_key, self._build_resource_rows
+            )
+        )
 
-        # self.combat_stat_rows: list[StatRow] = []
-        # self._build_combat_stat_rows()
+        self.damage_stat_rows = self.cached_rows(
+            "stats.damage", stats.version, self._build_damage_stat_rows
+        )
+        self.combat_stat_rows = self.cached_rows(
+            "stats.combat",
+            (stats.version, player.equipment.version),
+            self._build_combat_stat_rows,
+        )
 
-    def _build_base_stat_rows(self) -> None:
+    def _build_attribute_rows(self) -> list[StatRow]:
         rows: list[StatRow] = []
 
-        # --- ATTRIBUTES HEADER ---
-        rows.append(StatRow(None, "ATTRIBUTES", "", selectable=False))
-
         for stat_type, (label, value) in zip(
-            [
-                StatTypes.STRENGTH,
-                StatTypes.DEXTERITY,
-                StatTypes.CONSTITUTION,
-                StatTypes.INTELLIGENCE,
-                StatTypes.CUNNING,
-                StatTypes.WILLPOWER,
-            ],
-            self.gather_base_attributes(),
+            self.BASE_ATTRIBUTES, self.gather_base_attributes()
         ):
             rows.append(
                 StatRow(
@@ -675,27 +751,12 @@ class CharacterStatsHandler(CharacterInformationHandler):
                 )
             )
 
-        # spacer
-        rows.append(StatRow(None, "", "", selectable=False))
-
-        # --- RESOURCES HEADER ---
-        rows.append(StatRow(None, "RESOURCES", "", selectable=False))
+        return rows
 
-        resource_keys = [
-            StatTypes.HP,
-            StatTypes.HP_REGEN,
-            None,
-            StatTypes.ENERGY,
-            StatTypes.ENERGY_REGEN,
-            None,
-            StatTypes.MANA,
-            StatTypes.MANA_REGEN,
-            None,
-            StatTypes.CARRYING_CAPACITY,
-            StatTypes.ENCUMBRANCE,
-        ]
+    def _build_resource_rows(self) -> list[StatRow]:
+        rows: list[StatRow] = []
 
-        for key, (label, value) in zip(resource_keys, self.gather_resources()):
+        for key, (label, value) in zip(self.RESOURCE_ORDER, self.gather_resources()):
             if key is None:
                 rows.append(StatRow(None, "", "", selectable=False))
             else:
@@ -708,9 +769,9 @@ class CharacterStatsHandler(CharacterInformationHandler):
                     )
                 )
 
-        self.base_stat_rows = rows
+        return rows
 
-    def _build_damage_stat_rows(self) -> None:
+    def _build_damage_stat_rows(self) -> list[StatRow]:
         # damage stat rows are: (see the following variables)
 
         rows: list[StatRow] = []
@@ -733,9 +794,9 @@ class CharacterStatsHandler(CharacterInformationHandler):
             rows.append(StatRow(None, "", "", selectable=False))
             rows.append(StatRow(None, "", "", selectable=False))
 
-        self.damage_stat_rows = rows
+        return rows
 
-    def _build_combat_stat_rows(self) -> None:
+    def _build_combat_stat_rows(self) -> list[StatRow]:
         rows: list[StatRow] = []
 
         # --- WEAPONS ---
@@ -793,7 +854,7 @@ class CharacterStatsHandler(CharacterInformationHandler):
                 StatRow(key=stat_type, label=label, value=value, selectable=True)
             )
 
-        self.combat_stat_rows = rows
+        return rows
 
     def gather_weapon_stats(self) -> List[Tuple[str, str]]:
         """
@@ -1301,16 +1362,7 @@ class CharacterStatsHandler(CharacterInformationHandler):
         stats = self.engine.player.fighter.stats
         rows: List[Tuple[str, str]] = []
 
-        base_attributes = [
-            StatTypes.STRENGTH,
-            StatTypes.DEXTERITY,
-            StatTypes.CONSTITUTION,
-            StatTypes.INTELLIGENCE,
-            StatTypes.CUNNING,
-            StatTypes.WILLPOWER,
-        ]
-
-        for stat_type in base_attributes:
+        for stat_type in self.BASE_ATTRIBUTES:
             label = f"{stat_type.value.upper()}: "
             value = str(round_for_display(stats.get_stat(stat_type).value))
             rows.append((label, value))
@@ -1328,21 +1380,7 @@ class CharacterStatsHandler(CharacterInformationHandler):
         stats = self.engine.player.fighter.stats
         rows: List[Tuple[str, str]] = []
 
-        resource_order = [
-            StatTypes.HP,
-            StatTypes.HP_REGEN,
-            None,
-            StatTypes.ENERGY,
-            StatTypes.ENERGY_REGEN,
-            None,
-            StatTypes.MANA,
-            StatTypes.MANA_REGEN,
-            None,
-            StatTypes.CARRYING_CAPACITY,
-            StatTypes.ENCUMBRANCE,
-        ]
-
-        for stat_type in resource_order:
+        for stat_type in self.RESOURCE_ORDER:
             if stat_type is None:
                 rows.append(("", ""))
                 continue
@@ -1440,6 +1478,7 @@ class CharacterStatsHandler(CharacterInformationHandler):
         return final_rows
 
     def on_render(self, console):
+        self.refresh_stat_rows()
 
         match self.SELECTED_SUBTAB:
             case 0:
@@ -1516,14 +1555,22 @@ class CharacterInventoryHandler(CharacterInformationHandler):
         self.item_info_handler.parent = self
 
     def regenerate_inventory(self) -> None:
+        """Bring the rows up to date, only rebuilding them if the items changed."""
+        player = self.engine.player
         self._build_item_list()
         self._build_equipment()
-        self._build_inventory_rows()
+        self.inventory_rows = self.cached_rows(
+            "inventory.items",
+            (player.inventory.version, player.equipment.version),
+            self._build_inventory_rows,
+        )
         self.MAX_INVENTORY_PAGE = math.floor(
             len(self.item_list) / self.INVENTORY_ROWS_LENGTH
         )
         self._build_active_inventory_rows()
-        self._build_equipment_rows()
+        self.equipment_rows = self.cached_rows(
+            "inventory.equipment", player.equipment.version, self._build_equipment_rows
+        )
 
     def _build_item_list(self) -> None:
         self.item_list = self.engine.player.inventory.items
@@ -1537,18 +1584,19 @@ class CharacterInventoryHandler(CharacterInformationHandler):
 
     def _build_inventory_rows(self) -> List[InventoryRow]:
         rows: List[InventoryRow] = []
+        equipped = set(self.equipment.values())
 
         for idx, item in enumerate(self.item_list):
             item: Item
             letter = chr(ord("a") + (idx % 26))
             name = item.name
-            if item in self.equipment.values():
+            if item in equipped:
                 name += " (E)"
             selectable = True
             rows.append(
                 InventoryRow(item=item, letter=letter, name=name, selectable=selectable)
             )
-        self.inventory_rows = rows
+        return rows
 
     def _build_active_inventory_rows(self) -> List[InventoryRow]:
         rows: List[InventoryRow]
@@ -1597,7 +1645,7 @@ class CharacterInventoryHandler(CharacterInformationHandler):
             }:
                 self.add_row_spacer(rows)
 
-        self.equipment_rows = rows
+        return rows
 
     def move_selection_cursor(self, delta: int) -> None:
         match self.SELECTED_SUBTAB:
@@ -2269,7 +2317,11 @@ class CharacterEssenceHandler(CharacterInventoryHandler):
 
     def regenerate_inventory(self) -> None:
         self._build_item_list()
-        self._build_inventory_rows()
+        self.inventory_rows = self.cached_rows(
+            "essence.slots",
+            self.engine.player.essence.version,
+            self._build_inventory_rows,
+        )
         self.MAX_INVENTORY_PAGE = math.floor(
             len(self.item_list) / self.INVENTORY_ROWS_LENGTH
         )
@@ -2289,7 +2341,7 @@ class CharacterEssenceHandler(CharacterInventoryHandler):
             rows.append(
                 InventoryRow(item=item, letter=letter, name=name, selectable=selectable)
             )
-        self.inventory_rows = rows
+        return rows
 
     def _build_item_list(self) -> None:
         self.item_list = self.engine.player.essence.slots
@@ -2696,9 +2748,9 @@ class GameOverEventHandler(EventHandler):
 
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
-        save_path = Path("savegame.sav")
-        if save_path.exists():
-            save_path.unlink()  # Deletes the active save file.
+        savefile.delete(consts.SAVE_PATH)  # Deletes the active save file.
+        # and the messages it spilled
+        self.engine.message_log.spill_path.unlink(missing_ok=True)
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def _handle_quit(self) -> None:
@@ -2721,7 +2773,7 @@ class HistoryViewer(EventHandler):
 
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.log_length = len(engine.message_log.messages)
+        self.log_length = len(engine.message_log)
         self.cursor = self.log_length - 1
 
     def on_render(self, console: tcod.Console) -> None:
@@ -2741,13 +2793,13 @@ class HistoryViewer(EventHandler):
         )
 
         # Render the message log using the cursor parameter.
-        self.engine.message_log.render_messages(
+        self.engine.message_log.render_until(
             log_console,
             1,
             1,
             log_console.width - 2,
             log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
+            self.cursor + 1,
         )
         log_console.blit(console, 3, 3)
 
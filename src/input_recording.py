@@ -0,0 +1,192 @@
+"""
+Record the key presses of a real session, and replay them headlessly as a benchmark.
+
+    python src/main.py --record session.rec
+    python src/input_recording.py session.rec
+
+A recording starts at the main menu, so replays are only faithful for sessions that
+start a new game. Replays never touch the real save or message log: they play in a
+temporary directory, where a recorded "continue" finds no save to load. Maps
+generated in the background also draw from the global RNG, so a replay can drift
+from the original session if they finish at different turns.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+import random
+import statistics
+import struct
+import tempfile
+import time
+import traceback
+from typing import BinaryIO, List, Optional, Tuple
+
+import tcod
+
+import color
+import consts
+import exceptions
+from headless import dispatch, key_down, render
+from input_handlers import BaseEventHandler, EventHandler
+import setup_game
+
+MAGIC = b"TOBR"
+VERSION = 2
+# magic, version, RNG seed, whether a save existed when the recording started
+HEADER = struct.Struct("<4sHQ?")
+# milliseconds since the recording started, kind, key sym, key modifiers
+RECORD = struct.Struct("<IBiH")
+
+KEY = 0
+# a LoopHandler.tick of the main loop, recorded so resting is replayed exactly
+TICK = 1
+
+
+@dataclass
+class Recording:
+    seed: int
+    had_save: bool = False
+    records: List[Tuple[int, int, int, int]] = field(default_factory=list)
+
+
+class InputRecorder:
+    """Append the key presses and loop ticks of the main loop to a recording file."""
+
+    def __init__(self, path: Path, seed: int, had_save: bool):
+        self._file: BinaryIO = path.open("wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, seed, had_save))
+        self._start = time.perf_counter()
+
+    def _write(self, kind: int, sym: int = 0, mod: int = 0) -> None:
+        ms = int((time.perf_counter() - self._start) * 1000)
+        self._file.write(RECORD.pack(ms, kind, sym, mod))
+
+    def record_event(self, event: tcod.event.Event) -> None:
+        if isinstance(event, tcod.event.KeyDown):
+            self._write(KEY, event.sym, event.mod)
+
+    def record_tick(self) -> None:
+        self._write(TICK)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def load_recording(path: Path) -> Recording:
+    data = path.read_bytes()
+    magic, version, seed, had_save = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} input recording")
+    body = memoryview(data)[HEADER.size :]
+    # a recording cut short by a crash can end in a partial record
+    body = body[: len(body) - len(body) % RECORD.size]
+    return Recording(seed, had_save, list(RECORD.iter_unpack(body)))
+
+
+@dataclass
+class ReplayReport:
+    key_ms: List[float] = field(default_factory=list)
+    tick_ms: List[float] = field(default_factory=list)
+    seconds: float = 0.0
+    recorded_seconds: float = 0.0
+
+    def lines(self) -> List[str]:
+        lines = [
+            f"events           {len(self.key_ms)} keys, {len(self.tick_ms)} ticks",
+            f"replay time      {self.seconds:.2f} s",
+            f"recorded time    {self.recorded_seconds:.2f} s",
+        ]
+        for name, samples in (("key", self.key_ms), ("tick", self.tick_ms)):
+            if len(samples) > 1:
+                percentiles = statistics.quantiles(samples, n=100, method="inclusive")
+                lines.append(
+                    f"{name + ' ms':<17}p50 {percentiles[49]:.3f}"
+                    f"  p90 {percentiles[89]:.3f}  p99 {percentiles[98]:.3f}"
+                    f"  max {max(samples):.3f}"
+                )
+        return lines
+
+
+def replay(recording: Recording, render_frames: bool = True) -> ReplayReport:
+    """
+    Feed a recording back through the handlers, starting from the main menu with the
+    recorded seed, and time every event. Errors are handled like in main.main, except
+    that nothing is saved.
+
+    The save and message log paths point into a temporary directory for the length of
+    the replay. If a save existed when the recording started, an empty one stands in
+    for it so that the main menu asks before starting a new game, like it did then.
+    """
+    save_path, log_path = consts.SAVE_PATH, consts.MESSAGE_LOG_PATH
+    with tempfile.TemporaryDirectory(prefix="replay-") as directory:
+        consts.SAVE_PATH = Path(directory, save_path.name)
+        consts.MESSAGE_LOG_PATH = Path(directory, log_path.name)
+        if recording.had_save:
+            consts.SAVE_PATH.mkdir()
+        try:
+            return _replay(recording, render_frames)
+        finally:
+            consts.SAVE_PATH, consts.MESSAGE_LOG_PATH = save_path, log_path
+
+
+def _replay(recording: Recording, render_frames: bool) -> ReplayReport:
+    random.seed(recording.seed)
+    console = None
+    if render_frames:
+        console = tcod.console.Console(
+            consts.SCREEN_WIDTH, consts.SCREEN_HEIGHT, order="F"
+        )
+    handler: BaseEventHandler = setup_game.MainMenu()
+    render(handler, console)
+    report = ReplayReport()
+
+    start = time.perf_counter()
+    for _, kind, sym, mod in recording.records:
+        event_start = time.perf_counter()
+        try:
+            if kind == TICK:
+                if handler.ticking:
+                    handler = handler.tick(console)
+            else:
+                handler = dispatch(handler, key_down(sym, mod), console)
+        except exceptions.QuitToMainMenu:
+            if isinstance(handler, EventHandler):
+                handler.engine.close()
+            handler = setup_game.MainMenu()
+        except (exceptions.QuitWithoutSaving, SystemExit):
+            break
+        except Exception:  # handled like in main.main
+            traceback.print_exc()
+            if isinstance(handler, EventHandler):
+                handler.engine.message_log.add_message(
+                    traceback.format_exc(), color.error
+                )
+        render(handler, console)
+
+        elapsed_ms = (time.perf_counter() - event_start) * 1000
+        (report.tick_ms if kind == TICK else report.key_ms).append(elapsed_ms)
+    report.seconds = time.perf_counter() - start
+    if isinstance(handler, EventHandler):
+        handler.engine.close()
+    if recording.records:
+        report.recorded_seconds = recording.records[-1][0] / 1000
+    return report
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay an input recording.")
+    parser.add_argument("recording", type=Path)
+    parser.add_argument(
+        "--no-render", action="store_true", help="skip drawing frames entirely"
+    )
+    parsed = parser.parse_args(args)
+
+    report = replay(load_recording(parsed.recording), not parsed.no_render)
+    print("\n".join(report.lines()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,51 @@
+import argparse
+from pathlib import Path
+import random
+import time
 import traceback
+from typing import List, Optional
 
 import tcod
 
 import color
 import consts
 import exceptions
+from frame_timing import frame_timings
 import input_handlers
+from input_recording import InputRecorder
+import savefile
 import setup_game
 
 
-def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
-    """If the current event handler has an active Engine then save it."""
+def save_game(
+    handler: input_handlers.BaseEventHandler, path: Path, wait: bool = True
+) -> None:
+    """
+    If the current event handler has an active Engine then save it. Unless `wait`,
+    the save is written in the background and reported by process_background_work.
+    """
     if isinstance(handler, input_handlers.EventHandler):
-        handler.engine.save_as(filename)
-        print("Game saved.")
-
+        saving = savefile.save_writer.save(handler.engine, path)
+        if wait:
+            saving.result()
+            print("Game saved.")
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Tower of Babel")
+    parser.add_argument(
+        "--record",
+        type=Path,
+        help="record this session's key presses to a file, see input_recording.py",
+    )
+    parsed = parser.parse_args(args)
 
-def main() -> None:
+    recorder: Optional[InputRecorder] = None
+    if parsed.record is not None:
+        # the seed is part of the recording, so replays generate the same world
+        seed = random.randrange(2**64)
+        random.seed(seed)
+        recorder = InputRecorder(parsed.record, seed, consts.SAVE_PATH.exists())
 
     # load the font
     tileset = tcod.tileset.load_tilesheet(
@@ -35,27 +64,53 @@ def main() -> None:
         root_console = tcod.console.Console(
             width=consts.SCREEN_WIDTH, height=consts.SCREEN_HEIGHT, order="F"
         )
+        input_handlers.EventHandler.render_policy.present = context.present
+        frame_time = 1 / consts.FRAME_RATE
         try:
             while True:
+                frame_start = time.perf_counter()
                 root_console.clear()
-                handler.on_render(console=root_console)
-                context.present(root_console)
+                with frame_timings.measure("on_render"):
+                    handler.on_render(console=root_console)
+                if frame_timings.overlay:
+                    frame_timings.render(root_console)
+                with frame_timings.measure("present"):
+                    context.present(root_console)
+                frame_timings.end_frame(getattr(handler, "engine", None))
 
                 try:
-                    if isinstance(handler, input_handlers.LoopHandler):
-                        handler = handle_wait_handler(handler, context, root_console)
-                        continue
-                    for event in tcod.event.wait():
+                    with frame_timings.measure("background"):
+                        process_background_work(
+                            handler,
+                            deadline=time.perf_counter()
+                            + consts.BACKGROUND_BUDGET_MS / 1000,
+                        )
+
+                    # wait out the rest of the frame, but wake up as soon as there
+                    # is input so it is handled without delay
+                    remaining = frame_start + frame_time - time.perf_counter()
+                    for event in tcod.event.wait(max(remaining, 0)):
                         context.convert_event(
                             event
                         )  # mouse pixel coords into tile coords
+                        if handle_debug_key(event):
+                            continue
+                        if recorder is not None:
+                            recorder.record_event(event)
                         if isinstance(handler, input_handlers.EventHandler):
                             # pylint: disable-next=unexpected-keyword-arg
                             handler = handler.handle_events(event, root_console)
                         else:
                             handler = handler.handle_events(event)
+
+                    if handler.ticking:
+                        if recorder is not None:
+                            recorder.record_tick()
+                        handler = handler.tick(root_console)
                 except exceptions.QuitToMainMenu:
-                    save_game(handler, "savegame.sav")
+                    save_game(handler, consts.SAVE_PATH, wait=False)
+                    if isinstance(handler, input_handlers.EventHandler):
+                        handler.engine.close()
                     handler = setup_game.MainMenu()
                 except Exception:  # Handle exceptions in game.
                     traceback.print_exc()  # Print error to stderr.
@@ -67,32 +122,67 @@ def main() -> None:
         except exceptions.QuitWithoutSaving:
             raise
         except SystemExit:  # Save and quit.
-            save_game(handler, "savegame.sav")
+            save_game(handler, consts.SAVE_PATH)
             raise
         except BaseException:  # Save on any other unexpected exception.
-            save_game(handler, "savegame.sav")
+            save_game(handler, consts.SAVE_PATH)
             raise
-
-
-def handle_wait_handler(
-    handler: input_handlers.LoopHandler,
-    context: tcod.context.Context,
-    console: tcod.console.Console,
-):
-    # collect user input, if any
-    events = tcod.event.get()
-
-    for event in events:
-        context.convert_event(event)
-        new_handler = handler.handle_events(event, console)
-        if new_handler is not handler:
-            # wait was cancelled
-            return new_handler
-
-    # execute one rest tick
-    new_handler = handler.tick(console)
-
-    return new_handler
+        finally:
+            frame_timings.stop_csv()
+            if recorder is not None:
+                recorder.close()
+
+
+def handle_debug_key(event: tcod.event.Event) -> bool:
+    """
+    F3 toggles the frame timing overlay, F4 toggles streaming the timings to
+    consts.FRAME_TIMING_CSV_PATH. Returns True if the event was one of them.
+    """
+    if not isinstance(event, tcod.event.KeyDown):
+        return False
+    if event.sym == tcod.event.KeySym.F3:
+        frame_timings.overlay = not frame_timings.overlay
+    elif event.sym == tcod.event.KeySym.F4:
+        if frame_timings.recording:
+            frame_timings.stop_csv()
+        else:
+            frame_timings.start_csv()
+    else:
+        return False
+    return True
+
+
+def process_background_work(
+    handler: input_handlers.BaseEventHandler, deadline: float
+) -> None:
+    """
+    Collect what the background workers finished, until `deadline` passes, and start
+    an autosave when one is due.
+    """
+    engine = getattr(handler, "engine", None)
+    for saving in savefile.save_writer.poll():
+        error = saving.exception()
+        if error is None:
+            print("Game saved.")
+            continue
+        traceback.print_exception(error)
+        if engine is not None:
+            engine.message_log.add_message(f"Saving failed: {error}", color.error)
+
+    game_world = getattr(engine, "game_world", None)
+    game_floor = getattr(game_world, "game_floor", None)
+    if game_floor is not None:
+        game_floor.process_ready_maps(deadline)
+
+    if (
+        consts.AUTOSAVE_INTERVAL
+        and isinstance(handler, input_handlers.EventHandler)
+        and handler.engine.player.is_alive
+        and not savefile.save_writer.busy
+        and time.monotonic() - savefile.save_writer.last_save
+        >= consts.AUTOSAVE_INTERVAL
+    ):
+        save_game(handler, consts.SAVE_PATH, wait=False)
 
 
 if __name__ == "__main__":
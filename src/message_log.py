@@ -1,9 +1,16 @@
-from typing import Iterable, List, Reversible, Tuple
+from array import array
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Reversible, Tuple
 import textwrap
 
 import tcod
 
 import color
+import consts
+
+# how many spilled messages are read back from the file at a time
+SPILL_PAGE_SIZE = 64
 
 
 class Message:
@@ -12,6 +19,15 @@ class Message:
         self.fg = fg
         self.count = 1
 
+        # wrapped lines by width, along with the count they were wrapped for
+        self._wrapped: Dict[int, Tuple[int, List[str]]] = {}
+
+    def __getstate__(self) -> dict:
+        # the wrapped lines are cheap to rebuild, keep them out of saves
+        state = self.__dict__.copy()
+        state["_wrapped"] = {}
+        return state
+
     @property
     def full_text(self) -> str:
         """The full text of this message, including the count if necessary."""
@@ -19,10 +35,51 @@ class Message:
             return f"{self.plain_text} (x{self.count})"
         return self.plain_text
 
+    def wrapped(self, width: int) -> List[str]:
+        """full_text wrapped to `width`, only rewrapped when the count changes."""
+        cached = self._wrapped.get(width)
+        if cached is None or cached[0] != self.count:
+            cached = self.count, list(MessageLog.wrap(self.full_text, width))
+            self._wrapped[width] = cached
+        return cached[1]
+
 
 class MessageLog:
-    def __init__(self) -> None:
+    """
+    The message log. Only the most recent messages are kept in `messages`, older ones
+    are appended to the file at `spill_path` and read back from there on demand, so
+    neither memory nor save size grow with the length of the run.
+
+    Messages are numbered from the start of the run, message `i` is in memory if
+    `i >= spilled`. They are drawn walking back from the last one in view, which
+    needs no running count of wrapped lines: such a count would have to be rebuilt
+    from the whole spill after every load.
+    """
+
+    def __init__(
+        self,
+        memory: int = consts.MESSAGE_LOG_MEMORY,
+        spill_path: Optional[Path] = None,
+    ) -> None:
         self.messages: List[Message] = []
+        self.memory = memory
+        self.spill_path = consts.MESSAGE_LOG_PATH if spill_path is None else spill_path
+        # how many messages, and how many bytes of them, have been written to the spill.
+        # anything past spill_size was written after the last save and is discarded
+        self.spilled = 0
+        self.spill_size = 0
+        # byte offset of every spilled message, rebuilt from the file when needed
+        self._offsets: Optional[array] = None
+        # bumped whenever a message is added or stacks
+        self.version = 0
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_offsets"] = None
+        return state
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.messages)
 
     def add_message(
         self,
@@ -36,14 +93,86 @@ class MessageLog:
         If `stack` is True then the message can stack with a previous message
         of the same text.
         """
+        self.version += 1
         if stack and self.messages and text == self.messages[-1].plain_text:
             self.messages[-1].count += 1
         else:
             self.messages.append(Message(text, fg))
+            # spill in batches, so trimming the list stays cheap
+            if len(self.messages) >= 2 * self.memory:
+                self._spill(len(self.messages) - self.memory)
 
     def add_blank(self) -> None:
         self.add_message(" ", stack=False)
 
+    def _spill(self, count: int) -> None:
+        """Move the oldest `count` messages from memory to the end of the spill."""
+        records = [
+            json.dumps([message.plain_text, message.fg, message.count]).encode()
+            + b"\n"
+            for message in self.messages[:count]
+        ]
+        with open(self.spill_path, "ab") as f:
+            f.truncate(self.spill_size)
+            f.writelines(records)
+
+        if self._offsets is not None:
+            offset = self.spill_size
+            for record in records:
+                self._offsets.append(offset)
+                offset += len(record)
+        self.spill_size += sum(len(record) for record in records)
+        self.spilled += count
+        del self.messages[:count]
+
+    def _load_offsets(self) -> array:
+        if self._offsets is None:
+            self._offsets = array("Q")
+            offset = 0
+            try:
+                with open(self.spill_path, "rb") as f:
+                    for record in f:
+                        if offset >= self.spill_size:
+                            break
+                        self._offsets.append(offset)
+                        offset += len(record)
+            except FileNotFoundError:
+                pass
+        return self._offsets
+
+    def _read_spilled(self, start: int, stop: int) -> List[Message]:
+        """Read spilled messages `start` to `stop` back from the file."""
+        offsets = self._load_offsets()
+        stop = min(stop, len(offsets))
+        if start >= stop:
+            return []
+        with open(self.spill_path, "rb") as f:
+            f.seek(offsets[start])
+            records = [f.readline() for _ in range(stop - start)]
+
+        messages = []
+        for record in records:
+            text, fg, count = json.loads(record)
+            message = Message(text, tuple(fg))
+            message.count = count
+            messages.append(message)
+        return messages
+
+    def messages_before(self, end: int) -> Iterator[Message]:
+        """Iterate backwards over the messages before number `end`."""
+        end = min(end, len(self))
+        if end > self.spilled:
+            yield from reversed(self.messages[: end - self.spilled])
+            end = self.spilled
+
+        while end > 0:
+            start = max(end - SPILL_PAGE_SIZE, 0)
+            page = self._read_spilled(start, end)
+            if not page:
+                return
+            yield from reversed(page)
+            end = start
+
     def render(
         self,
         console: tcod.console.Console,
@@ -56,7 +185,23 @@ class MessageLog:
         `x`, `y`, `width`, `height` is the rectangular region to render onto
         the `console`.
         """
-        self.render_messages(console, x, y, width, height, self.messages)
+        self.render_until(console, x, y, width, height, len(self))
+
+    def render_until(
+        self,
+        console: tcod.console.Console,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        end: int,
+    ) -> None:
+        """Render the messages before number `end`, the last one at the bottom.
+        Only the messages that fit are visited, so the cost doesn't grow with the log.
+        """
+        self._render_backwards(
+            console, x, y, width, height, self.messages_before(end)
+        )
 
     @staticmethod
     def wrap(string: str, width: int) -> Iterable[str]:
@@ -82,10 +227,21 @@ class MessageLog:
         The `messages` are rendered starting at the last message and working
         backwards.
         """
+        cls._render_backwards(console, x, y, width, height, reversed(messages))
+
+    @staticmethod
+    def _render_backwards(
+        console: tcod.console.Console,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        messages: Iterable[Message],
+    ) -> None:
         y_offset = height - 1
 
-        for message in reversed(messages):
-            for line in reversed(list(cls.wrap(message.full_text, width))):
+        for message in messages:
+            for line in reversed(message.wrapped(width)):
                 console.print(x=x, y=y + y_offset, text=line, fg=message.fg)
                 y_offset -= 1
                 if y_offset < 0:
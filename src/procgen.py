@@ -8,7 +8,6 @@ import tcod
 
 import entity_factories
 from game_map import GameMap
-import tile_types
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -170,7 +169,7 @@ def generate_dungeon(
         # If there are no intersections then the room is valid.
 
         # Dig out this rooms inner area.
-        dungeon.tiles[new_room.inner] = tile_types.floor
+        dungeon.set_tiles(new_room.inner, "floor")
 
         if len(rooms) == 0:
             # The first room, where the player starts.
@@ -178,13 +177,13 @@ def generate_dungeon(
         else:  # All rooms after the first.
             # Dig out a tunnel between this room and the previous one.
             for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                dungeon.tiles[x, y] = tile_types.floor
+                dungeon.set_tiles((x, y), "floor")
 
         center_of_last_room = new_room.center
 
         place_entities(new_room, dungeon, engine.game_world.current_floor)
 
-        dungeon.tiles[center_of_last_room] = tile_types.up_stairs
+        dungeon.set_tiles(center_of_last_room, "up_stairs")
         dungeon.upstairs_location = center_of_last_room
 
         # Finally, append the new room to the list.
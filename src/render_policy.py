@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+import consts
+
+if TYPE_CHECKING:
+    from tcod.console import Console
+    from engine import Engine
+    from entity import Entity
+    from input_handlers import EventHandler
+
+
+class RenderPolicy:
+    """
+    Decides when a frame is drawn while enemy turns are being resolved.
+
+    A frame is only worth drawing if it is presented, so by default nothing is drawn
+    until the main loop renders the final state. With `animate_enemy_turns` enabled
+    (and a `present` callback bound by the main loop), a frame is drawn and presented
+    after every enemy turn the player could see, at most `max_fps` times per second.
+    """
+
+    def __init__(
+        self,
+        animate_enemy_turns: bool = consts.ANIMATE_ENEMY_TURNS,
+        max_fps: int = consts.ENEMY_TURN_MAX_FPS,
+        present: Optional[Callable[[Console], None]] = None,
+    ):
+        self.animate_enemy_turns = animate_enemy_turns
+        self.max_fps = max_fps
+        self.present = present
+
+        self._last_present = 0.0
+
+    def wants_frame(self, engine: Engine, entity: Optional[Entity]) -> bool:
+        """Return True if the turn `entity` just took should be shown to the player."""
+        if not self.animate_enemy_turns or self.present is None or entity is None:
+            return False
+        if not engine.last_turn_visible:
+            return False
+        return time.perf_counter() - self._last_present >= 1 / self.max_fps
+
+    def present_frame(self, handler: EventHandler, console: Console) -> None:
+        console.clear()
+        handler.on_render(console)
+        self.present(console)
+        self._last_present = time.perf_counter()
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from typing import Callable, Generic, Hashable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class RowModel(Generic[T]):
+    """
+    The rows of one section of a menu, only rebuilt when the key describing their
+    inputs (usually a few version counters) changes.
+
+    The models live on the Engine, so they survive the menu handlers, which are
+    recreated every time a screen is opened.
+    """
+
+    def __init__(self):
+        self.key: Optional[Hashable] = None
+        self.rows: List[T] = []
+
+    def get(self, key: Hashable, build: Callable[[], List[T]]) -> List[T]:
+        if key != self.key:
+            self.rows = build()
+            self.key = key
+        return self.rows
@@ -0,0 +1,386 @@
+"""
+Save files, as a directory holding one chunk per GameMap and a manifest for the rest.
+
+The manifest holds the Engine (the player, the message log, the floor layout...) with
+every GameMap on the floor replaced by a reference, and a table of the chunks. Each
+chunk holds one map and its entities, with the engine, the player and the other maps
+replaced by references. Saving only rewrites the chunks of maps that changed since
+they were written, which the table records through GameMap.save_version.
+
+Saves from before this format, a single compressed pickle of the Engine, can't be
+loaded: the classes in them have changed too much since. Saving over one replaces it.
+"""
+
+from __future__ import annotations
+
+from concurrent import futures
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+import io
+import json
+import lzma
+import os
+import pickle
+from pathlib import Path
+import shutil
+import struct
+import time
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, Hashable, List, Tuple
+import uuid
+
+from game_map import GameMap
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+MAGIC = b"TOWER OF BABEL SAVE 2\n"
+MANIFEST_NAME = "manifest"
+CHUNK_SUFFIX = ".chunk"
+# chunks are small, so higher presets barely shrink them but take several times as
+# long, mostly setting up their dictionary
+COMPRESSION_PRESET = 1
+
+# pickled objects are stored as their pickle's length, how many out-of-band buffers
+# it has, each buffer's length, the pickle and then the buffers
+_BLOB_HEADER = struct.Struct("<QI")
+_BUFFER_LENGTH = struct.Struct("<Q")
+
+MapKey = Tuple[int, int]
+
+
+def _ref(*key: Hashable) -> Any:
+    """Stands for the object `key` refers to, _RefUnpickler swaps in the real lookup."""
+    raise pickle.UnpicklingError("save file references are only loaded by savefile")
+
+
+class _RefPickler(pickle.Pickler):
+    """
+    Pickles the objects in `refs` as references instead of by value.
+
+    This uses reducer_override rather than persistent_id, which pickle calls for
+    every object, strings and numbers included. That made it most of the save time.
+    """
+
+    def __init__(
+        self,
+        file: io.BytesIO,
+        refs: Dict[int, Tuple],
+        buffer_callback: Callable[[pickle.PickleBuffer], Any],
+    ):
+        super().__init__(file, protocol=5, buffer_callback=buffer_callback)
+        self.refs = refs
+
+    def reducer_override(self, obj: Any) -> Any:
+        key = self.refs.get(id(obj))
+        if key is None:
+            return NotImplemented
+        return _ref, key
+
+
+class _RefUnpickler(pickle.Unpickler):
+    """Resolves the references written by _RefPickler through `refs`."""
+
+    def __init__(
+        self, file: io.BytesIO, refs: Dict[Tuple, Any], buffers: List[bytearray]
+    ):
+        super().__init__(file, buffers=buffers)
+        self.refs = refs
+
+    def find_class(self, module: str, name: str) -> Any:
+        if module == __name__ and name == _ref.__name__:
+            return lambda *key: self.refs[key]
+        return super().find_class(module, name)
+
+
+@dataclass
+class _Blob:
+    """A pickled object, with the contents of its NumPy arrays kept out-of-band."""
+
+    data: bytes
+    buffers: List[bytes]
+
+
+def _pickle(obj: Any, refs: Dict[int, Tuple]) -> _Blob:
+    file = io.BytesIO()
+    buffers: List[bytes] = []
+
+    def keep_out_of_band(buffer: pickle.PickleBuffer) -> bool:
+        # copied, the game goes on changing the arrays while the save is written
+        buffers.append(bytes(buffer.raw()))
+        return False
+
+    _RefPickler(file, refs, keep_out_of_band).dump(obj)
+    return _Blob(file.getvalue(), buffers)
+
+
+def _write_blob(file: BinaryIO, blob: _Blob) -> None:
+    """Compress `blob` into `file`, the buffers straight from where they are."""
+    with lzma.LZMAFile(file, "wb", preset=COMPRESSION_PRESET) as compressed:
+        compressed.write(_BLOB_HEADER.pack(len(blob.data), len(blob.buffers)))
+        for buffer in blob.buffers:
+            compressed.write(_BUFFER_LENGTH.pack(len(buffer)))
+        compressed.write(blob.data)
+        for buffer in blob.buffers:
+            compressed.write(buffer)
+
+
+def _read_exactly(file: BinaryIO, buffer: bytearray) -> bytearray:
+    view = memoryview(buffer)
+    while view:
+        read = file.readinto(view)
+        if not read:
+            raise EOFError("save file is truncated")
+        view = view[read:]
+    return buffer
+
+
+def _read_blob(file: BinaryIO, refs: Dict[Tuple, Any]) -> Any:
+    """
+    Load an object written by _write_blob. Every buffer is decompressed into its own
+    bytearray, which the unpickled arrays then use as their memory instead of a copy.
+    """
+    with lzma.LZMAFile(file) as compressed:
+        length, count = _BLOB_HEADER.unpack(
+            _read_exactly(compressed, bytearray(_BLOB_HEADER.size))
+        )
+        lengths = [
+            _BUFFER_LENGTH.unpack(
+                _read_exactly(compressed, bytearray(_BUFFER_LENGTH.size))
+            )[0]
+            for _ in range(count)
+        ]
+        data = _read_exactly(compressed, bytearray(length))
+        buffers = [_read_exactly(compressed, bytearray(n)) for n in lengths]
+    return _RefUnpickler(io.BytesIO(data), refs, buffers).load()
+
+
+def _floor_maps(engine: Engine) -> Dict[MapKey, GameMap]:
+    """The generated maps of the current floor, by position on the floor."""
+    game_world = getattr(engine, "game_world", None)
+    game_floor = getattr(game_world, "game_floor", None)
+    if game_floor is None:
+        return {}
+    # collect what the generation worker finished, it would be lost otherwise
+    game_floor.process_ready_maps()
+
+    maps = {}
+    for x in range(game_floor.floor_width):
+        for y in range(game_floor.floor_height):
+            gamemap = game_floor.floor[x, y]
+            if gamemap is not None:
+                maps[x, y] = gamemap
+    return maps
+
+
+# the chunk table is JSON, so it is keyed by "x,y"
+def _table_key(key: MapKey) -> str:
+    return f"{key[0]},{key[1]}"
+
+
+def _map_key(table_key: str) -> MapKey:
+    x, y = table_key.split(",")
+    return int(x), int(y)
+
+
+def _read_table(path: Path) -> Dict[str, dict]:
+    """The chunk table of the save at `path`, or nothing if there is no readable one."""
+    try:
+        with open(path / MANIFEST_NAME, "rb") as f:
+            if f.readline() != MAGIC:
+                return {}
+            return json.loads(f.readline())
+    except (OSError, ValueError):
+        return {}
+
+
+@dataclass
+class _Snapshot:
+    """A save, pickled but not yet compressed or written."""
+
+    path: Path
+    table: Dict[str, dict]
+    # the chunks that need writing, by file name
+    chunks: Dict[str, _Blob]
+    manifest: _Blob
+
+
+def _snapshot(engine: Engine, path: Path, old_table: Dict[str, dict]) -> _Snapshot:
+    maps = _floor_maps(engine)
+    map_refs = {id(gamemap): ("map", *key) for key, gamemap in maps.items()}
+    chunk_refs = {id(engine): ("engine",), id(engine.player): ("player",), **map_refs}
+    # the engine keeps simulating the current map, so its entities change even when
+    # its version doesn't
+    current = getattr(engine, "game_map", None)
+
+    table: Dict[str, dict] = {}
+    chunks: Dict[str, bytes] = {}
+    for key, gamemap in maps.items():
+        table_key = _table_key(key)
+        map_id, version = gamemap.map_id, list(gamemap.save_version)
+        old_entry = old_table.get(table_key)
+        if (
+            gamemap is not current
+            and old_entry is not None
+            and old_entry["map_id"] == map_id
+            and old_entry["version"] == version
+        ):
+            table[table_key] = old_entry
+            continue
+
+        # every write gets a new file, so the previous save stays whole until the
+        # new manifest replaces it
+        name = f"map_{key[0]}_{key[1]}_{uuid.uuid4().hex[:8]}{CHUNK_SUFFIX}"
+        chunks[name] = _pickle(gamemap.__getstate__(), chunk_refs)
+        table[table_key] = {"file": name, "map_id": map_id, "version": version}
+
+    return _Snapshot(path, table, chunks, _pickle(engine, map_refs))
+
+
+def _write_atomic(path: Path, write: Callable[[BinaryIO], None]) -> None:
+    """Write `path` with `write` through a temporary file, so it is never partial."""
+    temporary = path.with_name(path.name + ".tmp")
+    with open(temporary, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def _write(snapshot: _Snapshot) -> None:
+    path = snapshot.path
+    # a save from before chunks (which can't be loaded) is replaced once the new one
+    # is complete
+    legacy = path.is_file()
+    directory = path.with_name(path.name + ".tmp") if legacy else path
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for name, blob in snapshot.chunks.items():
+        _write_atomic(directory / name, partial(_write_blob, blob=blob))
+    missing = [
+        entry["file"]
+        for entry in snapshot.table.values()
+        if not (directory / entry["file"]).exists()
+    ]
+    if missing:
+        raise FileNotFoundError(f"chunks missing from {path}: {', '.join(missing)}")
+
+    def write_manifest(f: BinaryIO) -> None:
+        f.write(MAGIC)
+        f.write(json.dumps(snapshot.table).encode() + b"\n")
+        _write_blob(f, snapshot.manifest)
+
+    _write_atomic(directory / MANIFEST_NAME, write_manifest)
+    if legacy:
+        # a directory can't be renamed over a file
+        path.unlink()
+        os.replace(directory, path)
+
+    # chunks the new manifest doesn't use, and leftovers of interrupted writes
+    files = {entry["file"] for entry in snapshot.table.values()}
+    for leftover in path.iterdir():
+        if (
+            leftover.suffix in (CHUNK_SUFFIX, ".tmp")
+            and leftover.name not in files
+            and leftover.is_file()
+        ):
+            leftover.unlink()
+
+
+class SaveWriter:
+    """
+    Writes saves on a background thread.
+
+    The engine is pickled on the calling thread, which is the consistent snapshot and
+    the cheap part. Compressing and writing it, the slow part, happens on the
+    writer's thread, one save at a time and in order. Every file is written atomically
+    and the manifest last, so a crash mid-save leaves the previous save intact.
+    """
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save")
+        self._pending: List[Future] = []
+        # the chunk table of the last save scheduled for each path, which can be ahead
+        # of the one on disk
+        self._tables: Dict[Path, Dict[str, dict]] = {}
+        self.last_save = time.monotonic()
+
+    def save(self, engine: Engine, path: Path) -> Future:
+        """Snapshot `engine` and start writing it to `path`."""
+        old_table = self._tables.get(path)
+        if old_table is None:
+            old_table = _read_table(path)
+        snapshot = _snapshot(engine, path, old_table)
+        self._tables[path] = snapshot.table
+        self.last_save = time.monotonic()
+
+        saving = self._executor.submit(_write, snapshot)
+        saving.add_done_callback(lambda saving: self._check(saving, path))
+        self._pending.append(saving)
+        return saving
+
+    def _check(self, saving: Future, path: Path) -> None:
+        # after a failed save the table is ahead of the disk, start over from the disk
+        if saving.exception() is not None:
+            self._tables.pop(path, None)
+
+    @property
+    def busy(self) -> bool:
+        return any(not saving.done() for saving in self._pending)
+
+    def poll(self) -> List[Future]:
+        """Return the saves that finished since the last call."""
+        finished = [saving for saving in self._pending if saving.done()]
+        self._pending = [saving for saving in self._pending if not saving.done()]
+        return finished
+
+    def wait(self) -> None:
+        """Block until every save scheduled so far is on disk."""
+        futures.wait(self._pending)
+
+    def forget(self, path: Path) -> None:
+        """Drop what is known about the save at `path`, e.g. after deleting it."""
+        self._tables.pop(path, None)
+
+
+save_writer = SaveWriter()
+
+
+def save(engine: Engine, path: Path) -> None:
+    """Save `engine` to the directory `path`, only rewriting the chunks that changed."""
+    save_writer.save(engine, path).result()
+
+
+def load(path: Path) -> Engine:
+    """Load the Engine saved at `path`."""
+    save_writer.wait()
+    if path.is_file():
+        raise ValueError(f"{path} is from an older version of the game")
+
+    # the maps are created empty, so the manifest and the chunks can refer to them,
+    # then filled in from their chunk
+    with open(path / MANIFEST_NAME, "rb") as f:
+        if f.readline() != MAGIC:
+            raise ValueError(f"{path} is not a save file")
+        table = json.loads(f.readline())
+        shells: Dict[Tuple, GameMap] = {}
+        for table_key in table:
+            shells[("map", *_map_key(table_key))] = GameMap.__new__(GameMap)
+        engine = _read_blob(f, shells)
+
+    refs = {("engine",): engine, ("player",): engine.player, **shells}
+    for table_key, entry in table.items():
+        with open(path / entry["file"], "rb") as f:
+            state = _read_blob(f, refs)
+        shells[("map", *_map_key(table_key))].__dict__.update(state)
+    return engine
+
+
+def delete(path: Path) -> None:
+    """Delete the save at `path`, whichever format it is in."""
+    save_writer.wait()
+    save_writer.forget(path)
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
@@ -3,8 +3,6 @@
 from __future__ import annotations
 
 import copy
-import lzma
-import pickle
 import traceback
 from typing import Optional
 from pathlib import Path
@@ -17,6 +15,7 @@ from engine import Engine
 import entity_factories
 from game_map import GameWorld
 import input_handlers
+import savefile
 
 
 def new_game() -> Engine:
@@ -69,16 +68,15 @@ def new_game() -> Engine:
     return engine
 
 
-def load_game(filename: str) -> Engine:
-    """Load an Engine instance from a file."""
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
+def load_game(path: Path) -> Engine:
+    """Load an Engine instance from a save, see savefile.py."""
+    engine = savefile.load(path)
     assert isinstance(engine, Engine)
     return engine
 
 
-def check_if_save_file_exists(filename: str) -> bool:
-    return Path(filename).is_file()
+def check_if_save_file_exists(path: Path) -> bool:
+    return path.exists()
 
 
 class MainMenu(input_handlers.BaseEventHandler):
@@ -123,14 +121,14 @@ class MainMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
         if event.sym == tcod.event.KeySym.C:
             try:
-                return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
+                return input_handlers.MainGameEventHandler(load_game(consts.SAVE_PATH))
             except FileNotFoundError:
                 return input_handlers.PopupMessage(self, "No saved game to load.")
             except Exception as exc:
                 traceback.print_exc()  # Print to stderr.
                 return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
         elif event.sym == tcod.event.KeySym.N:
-            if check_if_save_file_exists("savegame.sav"):
+            if check_if_save_file_exists(consts.SAVE_PATH):
                 return input_handlers.AreYouSureToDeleteSave(self)
             else:
                 return input_handlers.MainGameEventHandler(new_game())
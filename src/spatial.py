@@ -0,0 +1,206 @@
+"""Entity position tables for a GameMap, and vectorized spatial queries over its living actors."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+import math
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+if TYPE_CHECKING:
+    from entity import Actor, Entity
+    from game_map import GameMap
+
+
+class EntityPositions:
+    """
+    Positions of a set of entities on a map, packed into NumPy arrays.
+
+    Every entity owns a slot: `xy[slot]` is its position and `occupied[slot]` is True.
+    Slots are reused once their entity leaves, and the arrays grow as needed.
+    GameMap keeps its tables up to date through add_entity, remove_entity and
+    move_entity.
+    """
+
+    def __init__(self, capacity: int = 32):
+        self.entities: List[Optional[Entity]] = [None] * capacity
+        self._slots: Dict[Entity, int] = {}
+        self._free: List[int] = list(reversed(range(capacity)))
+        self._allocate(capacity)
+
+    def __contains__(self, entity: Entity) -> bool:
+        return entity in self._slots
+
+    def add(self, entity: Entity) -> None:
+        if entity in self._slots:
+            self.move(entity)
+            return
+        if not self._free:
+            self._grow()
+
+        slot = self._free.pop()
+        self._slots[entity] = slot
+        self.entities[slot] = entity
+        self.occupied[slot] = True
+        self._write(slot, entity)
+
+    def remove(self, entity: Entity) -> None:
+        slot = self._slots.pop(entity, None)
+        if slot is None:
+            return
+
+        self.entities[slot] = None
+        self.occupied[slot] = False
+        self._free.append(slot)
+
+    def move(self, entity: Entity) -> None:
+        """Copy the entity's current position into its slot."""
+        self.xy[self._slots[entity]] = entity.x, entity.y
+
+    def _write(self, slot: int, entity: Entity) -> None:
+        """Fill in the arrays for a newly added entity."""
+        self.xy[slot] = entity.x, entity.y
+
+    def _allocate(self, capacity: int) -> None:
+        """Create (or grow) the arrays to `capacity` slots, keeping existing values."""
+        self.xy = _resized(getattr(self, "xy", None), (capacity, 2), np.int32)
+        self.occupied = _resized(getattr(self, "occupied", None), (capacity,), bool)
+
+    def _grow(self) -> None:
+        old_capacity = len(self.entities)
+        new_capacity = old_capacity * 2
+
+        self._allocate(new_capacity)
+        self.entities.extend([None] * old_capacity)
+        self._free.extend(reversed(range(old_capacity, new_capacity)))
+
+
+class GlyphPositions(EntityPositions):
+    """EntityPositions that also keep the glyph and color each entity is drawn with."""
+
+    def _write(self, slot: int, entity: Entity) -> None:
+        super()._write(slot, entity)
+        self.ch[slot] = ord(entity.char)
+        self.fg[slot] = entity.color
+
+    def _allocate(self, capacity: int) -> None:
+        super()._allocate(capacity)
+        self.ch = _resized(getattr(self, "ch", None), (capacity,), np.int32)
+        self.fg = _resized(getattr(self, "fg", None), (capacity, 3), np.uint8)
+
+    def visible_slots(self, visible: npt.NDArray[np.bool]) -> npt.NDArray:
+        """Return the occupied slots whose position is True in `visible`."""
+        return np.flatnonzero(self.occupied & visible[self.xy[:, 0], self.xy[:, 1]])
+
+
+def _resized(
+    array: Optional[npt.NDArray], shape: tuple[int, ...], dtype: npt.DTypeLike
+) -> npt.NDArray:
+    resized = np.zeros(shape, dtype=dtype)
+    if array is not None:
+        resized[: len(array)] = array
+    return resized
+
+
+def _slots_to_actors(positions: EntityPositions, slots: npt.NDArray) -> List[Actor]:
+    return [positions.entities[slot] for slot in slots.tolist()]
+
+
+def _squared_distances(positions: EntityPositions, x: int, y: int) -> npt.NDArray:
+    delta = positions.xy - np.array((x, y), dtype=np.int32)
+    return (delta * delta).sum(axis=1)
+
+
+def actors_within_radius(
+    gamemap: GameMap, x: int, y: int, radius: float
+) -> List[Actor]:
+    """Return the living actors whose (euclidean) distance to (x, y) is at most `radius`."""
+    positions = gamemap.actor_positions
+    hits = positions.occupied & (_squared_distances(positions, x, y) <= radius**2)
+    return _slots_to_actors(positions, np.flatnonzero(hits))
+
+
+def nearest_visible_actor(
+    gamemap: GameMap,
+    x: int,
+    y: int,
+    maximum_range: float,
+    exclude: Optional[Actor] = None,
+) -> Optional[Actor]:
+    """
+    Return the living actor closest to (x, y) that stands on a visible tile,
+    if it is less than `maximum_range` + 1 tiles away.
+    """
+    positions = gamemap.actor_positions
+    candidates = positions.occupied.copy()
+    if exclude is not None and exclude in positions:
+        candidates[positions._slots[exclude]] = False
+
+    xs, ys = positions.xy[:, 0], positions.xy[:, 1]
+    candidates &= gamemap.visible[xs, ys]
+
+    distances = _squared_distances(positions, x, y).astype(np.float64)
+    distances[~candidates] = np.inf
+    slot = int(np.argmin(distances))
+
+    if math.sqrt(distances[slot]) < maximum_range + 1.0:
+        return positions.entities[slot]
+    return None
+
+
+def actors_in_stencil(
+    gamemap: GameMap, x: int, y: int, stencil: npt.NDArray[np.bool]
+) -> List[Actor]:
+    """
+    Return the living actors covered by `stencil` when it is centered on (x, y).
+
+    `stencil` is a square boolean array with odd sides, such as the ones returned by
+    disk_stencil and cone_stencil.
+    """
+    positions = gamemap.actor_positions
+    radius = stencil.shape[0] // 2
+
+    offsets = positions.xy - np.array((x - radius, y - radius), dtype=np.int32)
+    inside = (
+        positions.occupied
+        & (offsets >= 0).all(axis=1)
+        & (offsets < stencil.shape[0]).all(axis=1)
+    )
+    slots = np.flatnonzero(inside)
+    slots = slots[stencil[offsets[slots, 0], offsets[slots, 1]]]
+    return _slots_to_actors(positions, slots)
+
+
+def _stencil_grid(radius: int) -> tuple[npt.NDArray, npt.NDArray]:
+    return np.ogrid[-radius : radius + 1, -radius : radius + 1]
+
+
+@lru_cache(maxsize=None)
+def disk_stencil(radius: int) -> npt.NDArray[np.bool]:
+    """A (2r + 1) x (2r + 1) read-only mask of the tiles within `radius` of its center."""
+    dx, dy = _stencil_grid(radius)
+    stencil = dx * dx + dy * dy <= radius * radius
+    stencil.flags.writeable = False
+    return stencil
+
+
+@lru_cache(maxsize=None)
+def cone_stencil(
+    radius: int, direction_x: int, direction_y: int, half_angle: float = math.pi / 4
+) -> npt.NDArray[np.bool]:
+    """
+    A (2r + 1) x (2r + 1) read-only mask of the tiles within `radius` of its center,
+    and within `half_angle` radians of the given direction. The center is not included.
+    """
+    dx, dy = _stencil_grid(radius)
+    heading = math.atan2(direction_y, direction_x)
+    angles = np.arctan2(dy, dx) - heading
+    # wrap into [-pi, pi) before comparing
+    angles = (angles + math.pi) % (2 * math.pi) - math.pi
+
+    stencil = disk_stencil(radius) & (np.abs(angles) <= half_angle)
+    stencil[radius, radius] = False
+    stencil.flags.writeable = False
+    return stencil
@@ -1,4 +1,6 @@
-from typing import Tuple
+from __future__ import annotations
+
+from typing import Dict, Iterable, Tuple
 
 import numpy as np
 
@@ -54,24 +56,87 @@ def new_tile(
 # SHROUD represents unexplored, unseen tiles
 SHROUD = np.array((ord(" "), (255, 255, 255), (0, 0, 0)), dtype=graphic_dt)
 
-"""
-floor = new_tile(
-    walkable=True,
-    transparent=True,
-    dark=(ord(" "), (255, 255, 255), (50, 50, 150)),
-    light=(ord(" "), (255, 255, 255), (200, 180, 50)),
-)
-wall = new_tile(
-    walkable=False,
-    transparent=False,
-    dark=(ord(" "), (255, 255, 255), (0, 0, 100)),
-    light=(ord(" "), (255, 255, 255), (130, 110, 50)),
-)
 
-up_stairs = new_tile(
-    walkable=True,
-    transparent=True,
-    dark=(ord("<"), (0, 0, 100), (50, 50, 150)),
-    light=(ord("<"), (255, 255, 255), (200, 180, 50)),
+class TileRegistry:
+    """
+    The palette of tiles a map can use.
+
+    Maps store a uint8 id per cell, and everything else about a tile is looked up
+    by id in the tables here, e.g. `registry.walkable[tile_ids]`.
+    """
+
+    def __init__(self, tiles: Iterable[Tuple[str, np.ndarray]] = ()):
+        self.ids: Dict[str, int] = {}
+        self.tiles = np.zeros(0, dtype=tile_dt)
+        for name, tile in tiles:
+            self.add(name, tile)
+
+    def __getitem__(self, name: str) -> int:
+        return self.ids[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.ids
+
+    def add(self, name: str, tile: np.ndarray) -> int:
+        """Register (or redefine) the tile called `name`, and return its id."""
+        if name in self.ids:
+            self.tiles[self.ids[name]] = tile
+            return self.ids[name]
+        if len(self.tiles) > np.iinfo(np.uint8).max:
+            raise ValueError(f"too many tiles to register {name}")
+
+        self.ids[name] = len(self.tiles)
+        self.tiles = np.append(self.tiles, tile)
+        return self.ids[name]
+
+    def copy(self) -> TileRegistry:
+        return TileRegistry((name, self.tiles[i]) for name, i in self.ids.items())
+
+    # lookup tables, indexed by tile id
+
+    @property
+    def walkable(self) -> np.ndarray:
+        return self.tiles["walkable"]
+
+    @property
+    def transparent(self) -> np.ndarray:
+        return self.tiles["transparent"]
+
+    @property
+    def dark(self) -> np.ndarray:
+        return self.tiles["dark"]
+
+    @property
+    def light(self) -> np.ndarray:
+        return self.tiles["light"]
+
+
+# the tiles every biome has. Biomes can add their own to a copy of it, never to it
+DEFAULT_REGISTRY = TileRegistry(
+    [
+        (
+            "wall",
+            new_tile(
+                ttype=TileTypes.WALL,
+                dark=(ord(" "), (255, 255, 255), (0, 0, 100)),
+                light=(ord(" "), (255, 255, 255), (130, 110, 50)),
+            ),
+        ),
+        (
+            "floor",
+            new_tile(
+                ttype=TileTypes.FLOOR,
+                dark=(ord(" "), (255, 255, 255), (50, 50, 150)),
+                light=(ord(" "), (255, 255, 255), (200, 180, 50)),
+            ),
+        ),
+        (
+            "up_stairs",
+            new_tile(
+                ttype=TileTypes.FLOOR,
+                dark=(ord("<"), (0, 0, 100), (50, 50, 150)),
+                light=(ord("<"), (255, 255, 255), (200, 180, 50)),
+            ),
+        ),
+    ]
 )
-"""